@@ -0,0 +1,64 @@
+import os
+import glob
+import time
+import itertools
+from datasketch import MinHash
+import clean_and_dedupe as cd
+
+# Micro-benchmark: n-gram filter and pairwise MinHash similarity, before vs after,
+# on the OCR outputs in pdfs/ (pdfs/*.txt, or the PDFs' text layer if none exist yet).
+
+PDF_DIR = "pdfs"
+REPEATS = 5
+
+def load_texts():
+    texts = []
+    for path in sorted(glob.glob(os.path.join(PDF_DIR, "*.txt"))):
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append(f.read())
+    if not texts:
+        import pdf_extract
+        texts = [pdf_extract.extract_text(p, ocr=False) for p in sorted(glob.glob(os.path.join(PDF_DIR, "*.pdf")))]
+    return texts
+
+def best_of(fn, repeats=REPEATS):
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+# --------------- Baselines (previous implementations) ---------------
+def ngrams_before(texts, n=5):
+    return [cd._remove_repetitive_ngrams_tuples(t.split(), n) for t in texts]
+
+def is_similar_before(a, b, threshold=cd.MINHASH_THRESHOLD):
+    m1, m2 = MinHash(num_perm=128), MinHash(num_perm=128)
+    for token in a.split(): m1.update(token.encode("utf8"))
+    for token in b.split(): m2.update(token.encode("utf8"))
+    return m1.jaccard(m2) >= threshold
+
+def main():
+    texts = load_texts()
+    tokens = sum(len(t.split()) for t in texts)
+    print(f"{len(texts)} documents, {tokens:,} tokens\n")
+
+    t_old, out_old = best_of(lambda: ngrams_before(texts))
+    t_new, out_new = best_of(lambda: [cd.remove_repetitive_ngrams(t) for t in texts])
+    assert out_old == out_new, "rolling-hash n-gram filter changed the output"
+    print("remove_repetitive_ngrams")
+    print(f"  tuples       {t_old * 1000:8.1f} ms")
+    print(f"  rolling hash {t_new * 1000:8.1f} ms   ({t_old / t_new:.1f}x)\n")
+
+    pairs = list(itertools.combinations(range(len(texts)), 2))
+    t_old, sim_old = best_of(lambda: [is_similar_before(texts[i], texts[j]) for i, j in pairs], repeats=1)
+    t_new, sims = best_of(lambda: cd.signature_similarity(cd.minhash_signatures(texts)), repeats=1)
+    sim_new = [bool(sims[i, j] >= cd.MINHASH_THRESHOLD) for i, j in pairs]
+    assert sim_old == sim_new, "batch similarity disagrees with pairwise is_similar"
+    print(f"all-pairs similarity ({len(pairs)} pairs)")
+    print(f"  is_similar per pair  {t_old * 1000:8.1f} ms")
+    print(f"  signature matrix     {t_new * 1000:8.1f} ms   ({t_old / t_new:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -2,37 +2,82 @@ import os
 import json
 import glob
 import re
+import time
 import hashlib
+import sqlite3
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import utils
-from langdetect import detect
-from datasketch import MinHash, MinHashLSH
+from langdetect import detect, DetectorFactory
+from datasketch import MinHash, MinHashLSH, LeanMinHash
+
+# langdetect is randomized; a fixed seed makes serial and parallel runs agree
+DetectorFactory.seed = 0
 
 TASK_1_OUTPUT = "arxiv_clean.json"
 TASK_2_OUTPUT = "pdfs/*.txt"
 TASK_3_OUTPUT = "../talks_transcripts/talks_transcripts.jsonl"
 MERGED_OUTPUT = "clean_corpus.txt"
 STATS_OUTPUT = "stats.md"
+DEDUPE_STATE = "dedupe_state.sqlite"
 
 MINHASH_THRESHOLD = 0.7
+NUM_PERM = 128
+PARALLEL_BATCH = 64         # texts per worker task
+
+# --------------- Stage Counters ---------------
+class StageStats:
+    """Items in/out, characters and wall time spent inside one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.chars = 0
+        self.seconds = 0.0
+
+    def row(self):
+        rate = self.items_in / self.seconds if self.seconds else 0.0
+        mb_s = self.chars / 1e6 / self.seconds if self.seconds else 0.0
+        return (f"| {self.name} | {self.items_in} | {self.items_out} | "
+                f"{self.seconds:.2f} | {rate:,.0f} | {mb_s:.2f} |")
 
 # --------------- Text Extraction ---------------
-def extract_text():
-    all_texts = []
+def iter_texts(stats=None):
+    """Yield raw texts one at a time from the arXiv JSON, OCR .txt files and transcripts."""
+    stats = stats or StageStats("read")
+
+    def emit(text):
+        stats.items_in += 1
+        stats.items_out += 1
+        stats.chars += len(text)
+        return text
 
+    t0 = time.perf_counter()
     task_1_path = utils.get_path(TASK_1_OUTPUT)
     if os.path.exists(task_1_path):
         with open(task_1_path, "r", encoding="utf-8") as f:
             data = json.load(f)
-            all_texts.extend([entry.get("abstract", "").strip() for entry in data if entry.get("abstract")])
+        for entry in data:
+            abstract = (entry.get("abstract") or "").strip()
+            if abstract:
+                stats.seconds += time.perf_counter() - t0
+                yield emit(abstract)
+                t0 = time.perf_counter()
+        del data
 
     for file_path in glob.glob(utils.get_path(TASK_2_OUTPUT)):
         try:
             with open(file_path, "r", encoding="utf-8") as f:
                 content = f.read().strip()
-                if content:
-                    all_texts.append(content)
         except Exception:
-            pass
+            continue
+        if content:
+            stats.seconds += time.perf_counter() - t0
+            yield emit(content)
+            t0 = time.perf_counter()
 
     task_3_path = utils.get_path(TASK_3_OUTPUT)
     if os.path.exists(task_3_path):
@@ -40,13 +85,17 @@ def extract_text():
             for line in f:
                 try:
                     entry = json.loads(line)
-                    text = entry.get("text", "").strip()
-                    if text:
-                        all_texts.append(text)
                 except json.JSONDecodeError:
                     continue
+                text = entry.get("text", "").strip()
+                if text:
+                    stats.seconds += time.perf_counter() - t0
+                    yield emit(text)
+                    t0 = time.perf_counter()
+    stats.seconds += time.perf_counter() - t0
 
-    return all_texts
+def extract_text():
+    return list(iter_texts())
 
 # --------------- Cleaning Functions ---------------
 def strip_html(text):
@@ -58,8 +107,10 @@ def remove_pii(text):
     text = re.sub(r"\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b", "", text)  # phone numbers
     return text
 
-def remove_repetitive_ngrams(text, n=5):
-    tokens = text.split()
+NGRAM_HASH_BASE = np.uint64(1_000_003)
+NGRAM_NUMPY_MIN_TOKENS = 64     # below this the tuple version is cheaper than NumPy setup
+
+def _remove_repetitive_ngrams_tuples(tokens, n):
     seen = set()
     result = []
     for i in range(len(tokens) - n + 1):
@@ -70,58 +121,322 @@ def remove_repetitive_ngrams(text, n=5):
     result.extend(tokens[len(result):])
     return " ".join(result)
 
+def remove_repetitive_ngrams(text, n=5):
+    """
+    Keep token i only if the n-gram starting at i has not appeared before.
+    N-grams are compared by a Rabin-Karp style polynomial hash over integer
+    token ids, computed for all windows at once with NumPy. When vocab**n fits
+    in 64 bits the hash is exact; otherwise collisions are checked against the
+    actual windows and fall back to exact tuples.
+    """
+    tokens = text.split()
+    m = len(tokens) - n + 1
+    if len(tokens) < NGRAM_NUMPY_MIN_TOKENS or m <= 0:
+        return _remove_repetitive_ngrams_tuples(tokens, n)
+
+    vocab = {t: i for i, t in enumerate(dict.fromkeys(tokens))}
+    ids = np.fromiter(map(vocab.__getitem__, tokens), dtype=np.uint64, count=len(tokens))
+    exact = len(vocab) ** n < 2 ** 64
+    base = np.uint64(len(vocab)) if exact else NGRAM_HASH_BASE
+    h = np.zeros(m, dtype=np.uint64)
+    for k in range(n):
+        h = h * base + ids[k:k + m]   # wraps mod 2**64 when not exact
+
+    if exact:
+        _, first = np.unique(h, return_index=True)
+    else:
+        _, first, inverse = np.unique(h, return_index=True, return_inverse=True)
+        windows = np.lib.stride_tricks.sliding_window_view(ids, n)
+        if (windows != windows[first[inverse]]).any():
+            return _remove_repetitive_ngrams_tuples(tokens, n)
+
+    keep = np.sort(first)
+    result = [tokens[i] for i in keep.tolist()]
+    result.extend(tokens[len(result):])
+    return " ".join(result)
+
 # --------------- Deduplication via MinHash ---------------
 def is_similar(a, b, threshold=MINHASH_THRESHOLD):
-    m1, m2 = MinHash(num_perm=128), MinHash(num_perm=128)
-    for token in a.split(): m1.update(token.encode("utf8"))
-    for token in b.split(): m2.update(token.encode("utf8"))
-    return m1.jaccard(m2) >= threshold
+    return signature_similarity(minhash_signatures([a, b]))[0, 1] >= threshold
 
-def deduplicate_texts(texts):
-    lsh = MinHashLSH(threshold=MINHASH_THRESHOLD, num_perm=128)
-    unique = []
-    hash_to_text = {}
-    for idx, text in enumerate(texts):
-        m = MinHash(num_perm=128)
-        for token in text.split():
-            m.update(token.encode("utf8"))
-        key = f"doc_{idx}"
-        if not any(lsh.query(m)):
+def minhash_signatures(texts):
+    """(len(texts), NUM_PERM) uint64 signature matrix; each text is hashed once."""
+    if not texts:
+        return np.empty((0, NUM_PERM), dtype=np.uint64)
+    return np.vstack([minhash_of(t).hashvalues for t in texts])
+
+def signature_similarity(sig_a, sig_b=None, max_cells=1 << 25):
+    """Estimated Jaccard for every (row of sig_a, row of sig_b) pair, blockwise to cap memory."""
+    sig_b = sig_a if sig_b is None else sig_b
+    out = np.empty((len(sig_a), len(sig_b)), dtype=np.float32)
+    block = max(1, max_cells // max(1, len(sig_b) * sig_a.shape[1]))
+    for s in range(0, len(sig_a), block):
+        out[s:s + block] = (sig_a[s:s + block, None, :] == sig_b[None, :, :]).mean(axis=2)
+    return out
+
+def similar_pairs(texts, threshold=MINHASH_THRESHOLD):
+    """All (i, j, score) with i < j whose estimated Jaccard is >= threshold."""
+    sims = signature_similarity(minhash_signatures(texts))
+    ii, jj = np.nonzero(np.triu(sims >= threshold, k=1))
+    return [(int(i), int(j), float(sims[i, j])) for i, j in zip(ii, jj)]
+
+def minhash_of(text):
+    m = MinHash(num_perm=NUM_PERM)
+    m.update_batch([token.encode("utf8") for token in text.split()])
+    return m
+
+def content_key(text):
+    return hashlib.sha1(text.encode("utf8")).hexdigest()
+
+def dedupe_signed_stream(signed, stats=None, lsh=None, on_insert=None):
+    """
+    Ordered LSH consumer over (text, MinHash) pairs: yield texts that are not
+    near-duplicates of an earlier one. Only signatures are retained.
+    Pass an existing `lsh` to dedupe against earlier runs; `on_insert(key, m)`
+    is called for every kept text.
+    """
+    stats = stats or StageStats("dedupe")
+    lsh = lsh or MinHashLSH(threshold=MINHASH_THRESHOLD, num_perm=NUM_PERM)
+    for text, m in signed:
+        t0 = time.perf_counter()
+        stats.items_in += 1
+        stats.chars += len(text)
+        keep = not any(lsh.query(m))
+        if keep:
+            key = content_key(text)
             lsh.insert(key, m)
-            unique.append(text)
-            hash_to_text[key] = text
-    return unique
+            if on_insert:
+                on_insert(key, m)
+            stats.items_out += 1
+        stats.seconds += time.perf_counter() - t0
+        if keep:
+            yield text
+
+def dedupe_stream(texts, stats=None, lsh=None, on_insert=None):
+    stats = stats or StageStats("dedupe")
+
+    def signed():
+        for text in texts:
+            t0 = time.perf_counter()
+            m = minhash_of(text)
+            stats.seconds += time.perf_counter() - t0
+            yield text, m
+
+    return dedupe_signed_stream(signed(), stats, lsh, on_insert)
+
+def deduplicate_texts(texts):
+    return list(dedupe_stream(texts))
+
+# --------------- Persistent Dedup State ---------------
+class DedupeState:
+    """
+    SQLite store of every raw-text hash already processed and the MinHash
+    signatures of kept texts, so later runs only clean and hash new texts.
+    Changes are committed once, after clean_corpus.txt has been written.
+    """
+
+    def __init__(self, path):
+        self.con = sqlite3.connect(path)
+        self.con.executescript("""
+            CREATE TABLE IF NOT EXISTS seen (hash TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS signatures (key TEXT PRIMARY KEY, minhash BLOB NOT NULL);
+        """)
+
+    def is_empty(self):
+        return self.con.execute("SELECT 1 FROM seen LIMIT 1").fetchone() is None
+
+    def clear(self):
+        self.con.executescript("DELETE FROM seen; DELETE FROM signatures;")
+
+    def load_seen(self):
+        return {h for (h,) in self.con.execute("SELECT hash FROM seen")}
+
+    def load_lsh(self):
+        lsh = MinHashLSH(threshold=MINHASH_THRESHOLD, num_perm=NUM_PERM)
+        with lsh.insertion_session() as session:
+            for key, blob in self.con.execute("SELECT key, minhash FROM signatures"):
+                session.insert(key, LeanMinHash.deserialize(blob))
+        return lsh
+
+    def mark_seen(self, digest):
+        self.con.execute("INSERT OR IGNORE INTO seen(hash) VALUES (?)", (digest,))
+
+    def add_signature(self, key, m):
+        lm = m if isinstance(m, LeanMinHash) else LeanMinHash(m)
+        buf = bytearray(lm.bytesize())
+        lm.serialize(buf)
+        self.con.execute("INSERT OR REPLACE INTO signatures(key, minhash) VALUES (?,?)", (key, bytes(buf)))
+
+    def commit(self):
+        self.con.commit()
+
+    def close(self):
+        self.con.close()
+
+def skip_seen(texts, state, seen, stats=None):
+    """Drop texts whose raw content hash was processed by an earlier run."""
+    stats = stats or StageStats("skip-seen")
+    for t in texts:
+        t0 = time.perf_counter()
+        stats.items_in += 1
+        digest = content_key(t)
+        new = digest not in seen
+        if new:
+            seen.add(digest)
+            state.mark_seen(digest)
+            stats.items_out += 1
+            stats.chars += len(t)
+        stats.seconds += time.perf_counter() - t0
+        if new:
+            yield t
 
 # --------------- Processing Pipeline ---------------
-def process_clean_and_dedupe():
-    raw_texts = extract_text()
-    initial_count = len(raw_texts)
+def clean_text(t):
+    """Return the cleaned text, or None if it is not English."""
+    try:
+        if detect(t) != "en":
+            return None
+    except:
+        return None
+    t = strip_html(t)
+    t = remove_pii(t)
+    t = remove_repetitive_ngrams(t)
+    return t.strip()
 
-    cleaned = []
-    for t in raw_texts:
-        try:
-            if detect(t) != "en":
-                continue
-        except:
-            continue
-        t = strip_html(t)
-        t = remove_pii(t)
-        t = remove_repetitive_ngrams(t)
-        cleaned.append(t.strip())
+def clean_stream(texts, stats=None):
+    stats = stats or StageStats("clean")
+    for t in texts:
+        t0 = time.perf_counter()
+        stats.items_in += 1
+        stats.chars += len(t)
+        cleaned = clean_text(t)
+        stats.seconds += time.perf_counter() - t0
+        if cleaned is not None:
+            stats.items_out += 1
+            yield cleaned
 
-    deduped = deduplicate_texts(cleaned)
+# --------------- Parallel Clean + Sign ---------------
+def _clean_and_sign_batch(batch):
+    """Worker: clean each text and compute its (compactly pickled) MinHash."""
+    t0 = time.perf_counter()
+    out = []
+    for text in batch:
+        cleaned = clean_text(text)
+        out.append(None if cleaned is None else (cleaned, LeanMinHash(minhash_of(cleaned))))
+    return out, time.perf_counter() - t0
 
-    with open(utils.get_path(MERGED_OUTPUT), "w", encoding="utf-8") as f:
-        for line in deduped:
-            f.write(line + "\n")
+def _batches(texts, size):
+    batch = []
+    for t in texts:
+        batch.append(t)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
+def parallel_clean_and_sign(texts, workers, stats=None, batch_size=PARALLEL_BATCH):
+    """
+    Clean and MinHash texts in a process pool, yielding (cleaned, MinHash) in
+    input order. At most 2 * workers batches are in flight, so memory stays flat.
+    """
+    stats = stats or StageStats("clean+sign")
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        batches = _batches(texts, batch_size)
+        for batch in batches:
+            stats.items_in += len(batch)
+            stats.chars += sum(len(t) for t in batch)
+            pending.append(pool.submit(_clean_and_sign_batch, batch))
+            if len(pending) < 2 * workers:
+                continue
+            yield from _drain(pending.popleft(), stats)
+        while pending:
+            yield from _drain(pending.popleft(), stats)
+
+def _drain(fut, stats):
+    results, secs = fut.result()
+    stats.seconds += secs   # worker CPU time, summed over processes
+    for r in results:
+        if r is not None:
+            stats.items_out += 1
+            yield r
+
+def write_stats(stages, initial_count, kept, wall):
+    removed = initial_count - kept
     with open(utils.get_path(STATS_OUTPUT), "w", encoding="utf-8") as f:
         f.write(f"Original texts: {initial_count}\n")
-        f.write(f"After cleaning & deduplication: {len(deduped)}\n")
-        f.write(f"Removed: {initial_count - len(deduped)} ({(initial_count - len(deduped)) / initial_count:.2%})\n")
+        f.write(f"After cleaning & deduplication: {kept}\n")
+        f.write(f"Removed: {removed} ({removed / initial_count if initial_count else 0:.2%})\n")
+        f.write(f"\nWall time: {wall:.2f}s\n\n")
+        f.write("| Stage | Items in | Items out | Seconds | Items/s | MB/s |\n")
+        f.write("|---|---|---|---|---|---|\n")
+        for st in stages:
+            f.write(st.row() + "\n")
+
+def process_clean_and_dedupe(workers=1, incremental=False):
+    """
+    Stream sources → cleaners → MinHash dedup → clean_corpus.txt, one text at a time.
+    With workers > 1, cleaning and signatures run in a process pool; the LSH stage
+    stays ordered, so the output is identical to the serial run.
+    With incremental=True, the LSH index and seen-hashes persist in dedupe_state.sqlite;
+    only new texts are cleaned and hashed, and survivors are appended to the corpus.
+    """
+    read_st, write_st = StageStats("read"), StageStats("write")
+    dedupe_st = StageStats("dedupe")
+    stages = [read_st]
+    t_start = time.perf_counter()
+
+    texts = iter_texts(read_st)
+    lsh, on_insert, state = None, None, None
+    append = False
+    if incremental:
+        state = DedupeState(utils.get_path(DEDUPE_STATE))
+        append = not state.is_empty() and os.path.exists(utils.get_path(MERGED_OUTPUT))
+        if append:
+            seen, lsh = state.load_seen(), state.load_lsh()
+        else:
+            state.clear()
+            seen = set()
+        skip_st = StageStats("skip-seen")
+        stages.append(skip_st)
+        texts = skip_seen(texts, state, seen, skip_st)
+        on_insert = state.add_signature
+
+    if workers > 1:
+        clean_st = StageStats(f"clean+sign ({workers} procs, CPU s)")
+        signed = parallel_clean_and_sign(texts, workers, clean_st)
+        kept = dedupe_signed_stream(signed, dedupe_st, lsh, on_insert)
+    else:
+        clean_st = StageStats("clean")
+        kept = dedupe_stream(clean_stream(texts, clean_st), dedupe_st, lsh, on_insert)
+    stages += [clean_st, dedupe_st, write_st]
+
+    with open(utils.get_path(MERGED_OUTPUT), "a" if append else "w", encoding="utf-8") as f:
+        for line in kept:
+            t0 = time.perf_counter()
+            f.write(line + "\n")
+            write_st.items_in += 1
+            write_st.items_out += 1
+            write_st.chars += len(line)
+            write_st.seconds += time.perf_counter() - t0
+
+    if state:
+        state.commit()
+        state.close()
+
+    initial_count = stages[1].items_out if incremental else read_st.items_out
+    write_stats(stages, initial_count, dedupe_st.items_out, time.perf_counter() - t_start)
 
-    print("[✓] Cleaned and deduplicated corpus written to", MERGED_OUTPUT)
+    verb = "appended to" if append else "written to"
+    print(f"[✓] Cleaned and deduplicated corpus {verb}", MERGED_OUTPUT)
     print("[✓] Stats written to", STATS_OUTPUT)
 
 if __name__ == "__main__":
-    process_clean_and_dedupe()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes for cleaning + MinHash (0 = all cores)")
+    parser.add_argument("--incremental", action="store_true",
+                        help=f"reuse {DEDUPE_STATE} and only process new texts")
+    args = parser.parse_args()
+    process_clean_and_dedupe(workers=args.workers or os.cpu_count() or 1, incremental=args.incremental)
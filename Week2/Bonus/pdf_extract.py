@@ -0,0 +1,122 @@
+import os
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+import fitz  # PyMuPDF
+
+# Text layer first, OCR only the pages that need it.
+# Born-digital arXiv PDFs almost never hit the OCR path; scanned ones do.
+
+MIN_CHARS_PER_PAGE = 200        # fewer visible chars than this → likely a scan/figure page
+# Text density floor over the page area: 5/sq in is ~470 chars on Letter/A4 (a full page
+# of paper text is ~35/sq in), so a scan whose text layer holds only a few hundred chars
+# (header, captions) is still OCR'd; on larger pages it scales the floor up with the area
+MIN_CHARS_PER_SQ_INCH = 5.0
+MAX_GARBAGE_RATIO = 0.10        # share of replacement/control/private-use chars allowed
+OCR_DPI = 300
+
+# --------------- Helpers ---------------
+def pdf_hash(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            h.update(block)
+    return h.hexdigest()
+
+def garbage_ratio(text):
+    chars = [c for c in text if not c.isspace()]
+    if not chars:
+        return 1.0
+    bad = sum(1 for c in chars if c == "\ufffd" or unicodedata.category(c) in ("Cc", "Co", "Cs", "Cn"))
+    return bad / len(chars)
+
+def needs_ocr(text, page_rect=None):
+    visible = sum(1 for c in text if not c.isspace())
+    if visible < MIN_CHARS_PER_PAGE:
+        return True
+    if page_rect is not None:
+        sq_inches = (page_rect.width / 72) * (page_rect.height / 72)
+        if sq_inches and visible / sq_inches < MIN_CHARS_PER_SQ_INCH:
+            return True
+    return garbage_ratio(text) > MAX_GARBAGE_RATIO
+
+def render_page(page, dpi=OCR_DPI):
+    from PIL import Image
+    pix = page.get_pixmap(dpi=dpi)
+    return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+def ocr_image(img):
+    import pytesseract
+    return pytesseract.image_to_string(img)
+
+# --------------- Per-page cache ---------------
+class PageCache:
+    """SQLite cache of extracted page text keyed by (PDF sha256, page number)."""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.con = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.con.execute("PRAGMA journal_mode=WAL")   # several extraction processes may share the file
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                pdf_hash TEXT NOT NULL,
+                page     INTEGER NOT NULL,
+                method   TEXT NOT NULL,
+                text     TEXT NOT NULL,
+                PRIMARY KEY (pdf_hash, page)
+            )
+        """)
+        self.con.commit()
+
+    def get_all(self, digest):
+        with self.lock:
+            rows = self.con.execute(
+                "SELECT page, method, text FROM pages WHERE pdf_hash = ?", (digest,)
+            ).fetchall()
+        return {page: (method, text) for page, method, text in rows}
+
+    def put(self, digest, page, method, text):
+        with self.lock:
+            self.con.execute(
+                "INSERT OR REPLACE INTO pages(pdf_hash, page, method, text) VALUES (?,?,?,?)",
+                (digest, page, method, text),
+            )
+            self.con.commit()
+
+    def close(self):
+        with self.lock:
+            self.con.close()
+
+# --------------- Extraction ---------------
+def extract_pages(path, cache=None, ocr=True, dpi=OCR_DPI):
+    """
+    Return [{"page": 1-based number, "method": "text"|"ocr"|"cache:...", "text": str}].
+    Pages whose text layer fails the density/garbage checks are OCR'd when `ocr` is set.
+    """
+    digest = pdf_hash(path) if cache else None
+    cached = cache.get_all(digest) if cache else {}
+    out = []
+    with fitz.open(path) as doc:
+        for i, page in enumerate(doc, 1):
+            if i in cached:
+                method, text = cached[i]
+                out.append({"page": i, "method": f"cache:{method}", "text": text})
+                continue
+
+            text, method = page.get_text("text"), "text"
+            if ocr and needs_ocr(text, page.rect):
+                try:
+                    text, method = ocr_image(render_page(page, dpi)), "ocr"
+                except Exception as e:
+                    # Keep the text layer for now but don't cache it, so OCR is retried next run
+                    print(f"[!] OCR failed for {os.path.basename(path)} page {i}: {e}")
+                    method = "text-unverified"
+            if cache and method != "text-unverified":
+                cache.put(digest, i, method, text)
+            out.append({"page": i, "method": method, "text": text})
+    return out
+
+def extract_text(path, cache=None, ocr=True, dpi=OCR_DPI):
+    return "\n".join(p["text"] for p in extract_pages(path, cache=cache, ocr=ocr, dpi=dpi))
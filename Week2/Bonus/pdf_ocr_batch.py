@@ -1,58 +1,200 @@
 import os
 import json
+import time
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
 import requests
+import fitz  # PyMuPDF
 from pdf2image import convert_from_path
 import pytesseract
+import pdf_extract
 
 # Optional: specify tesseract executable path
 # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
-# Setup folders
-os.makedirs("pdfs", exist_ok=True)
-os.makedirs("pdf_ocr", exist_ok=True)
+DPI = 300
+OCR_WORKERS = os.cpu_count() or 1
+MAX_PAGES_IN_FLIGHT = OCR_WORKERS + 2   # rendered bitmaps alive at once (bounds memory)
+DOWNLOAD_AHEAD = 4                      # PDFs downloaded ahead of the renderer
+DOWNLOAD_TIMEOUT = (10, 120)            # (connect, read) seconds per PDF request
+PAGE_CACHE = "pdf_ocr/page_cache.sqlite"
 
-# Load paper metadata from Task 1
-with open("arxiv_clean.json", "r", encoding="utf-8") as f:
-    papers = json.load(f)
+# --------------- Stage timings ---------------
+class StageTimer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seconds = {"download": 0.0, "text": 0.0, "render": 0.0, "ocr": 0.0}
+        self.counts = {"download": 0, "text": 0, "render": 0, "ocr": 0}
 
-# Process each paper
-for paper in papers:
-    paper_id = paper["url"].split("/")[-1]
-    pdf_path = f"pdfs/{paper_id}.pdf"
-    txt_path = f"pdf_ocr/{paper_id}.txt"
+    def add(self, stage, seconds):
+        with self.lock:
+            self.seconds[stage] += seconds
+            self.counts[stage] += 1
 
-    # Skip if already done
-    if os.path.exists(txt_path):
-        continue
+    def report(self, wall):
+        lines = [f"Wall time: {wall:.1f}s"]
+        for stage, secs in self.seconds.items():
+            n = self.counts[stage]
+            avg = secs / n if n else 0.0
+            lines.append(f"  {stage:<8} {secs:8.1f}s total  {n:5d} items  {avg:6.2f}s avg")
+        return "\n".join(lines)
 
-    # Download PDF
+# --------------- Stage 1: download ---------------
+def pdf_url_for(paper_id):
     # Use category prefix for old IDs if needed
     prefix = "cs" if len(paper_id) <= 10 else ""
-    pdf_url = f"https://arxiv.org/pdf/{prefix + '/' if prefix else ''}{paper_id}.pdf"
+    return f"https://arxiv.org/pdf/{prefix + '/' if prefix else ''}{paper_id}.pdf"
 
-    response = requests.get(pdf_url)
-    if response.status_code != 200:
-        print(f"[!] Failed to download {pdf_url}")
-        continue
+def download_stage(papers, out_q, timer):
+    sess = requests.Session()
+    try:
+        for paper in papers:
+            paper_id = paper["url"].split("/")[-1]
+            pdf_path = f"pdfs/{paper_id}.pdf"
+            txt_path = f"pdf_ocr/{paper_id}.txt"
 
-    with open(pdf_path, "wb") as f:
-        f.write(response.content)
-    print(f"[+] Downloaded {pdf_path}")
+            # Skip if already done
+            if os.path.exists(txt_path):
+                continue
 
-    # Convert PDF to images
-    try:
-        images = convert_from_path(pdf_path, dpi=300)
-    except Exception as e:
-        print(f"[!] PDF conversion error for {paper_id}: {e}")
-        continue
-
-    # OCR all pages and concatenate
-    full_text = ""
-    for i, img in enumerate(images):
-        text = pytesseract.image_to_string(img)
-        full_text += f"\n--- Page {i + 1} ---\n{text}"
-
-    # Save to text file
-    with open(txt_path, "w", encoding="utf-8") as f:
-        f.write(full_text)
-    print(f"[✓] OCR saved to {txt_path}")
+            if not os.path.exists(pdf_path):
+                pdf_url = pdf_url_for(paper_id)
+                t0 = time.perf_counter()
+                try:
+                    response = sess.get(pdf_url, timeout=DOWNLOAD_TIMEOUT)
+                    if response.status_code != 200:
+                        print(f"[!] Failed to download {pdf_url}")
+                        continue
+                    # write then rename, so an interrupted download never leaves a truncated PDF behind
+                    with open(pdf_path + ".part", "wb") as f:
+                        f.write(response.content)
+                    os.replace(pdf_path + ".part", pdf_path)
+                except Exception as e:
+                    print(f"[!] Download error for {paper_id}: {e}")
+                    continue
+                timer.add("download", time.perf_counter() - t0)
+                print(f"[+] Downloaded {pdf_path}")
+
+            out_q.put((paper_id, pdf_path, txt_path))
+    finally:
+        # always unblock render_stage, even if this thread dies
+        out_q.put(None)
+
+# --------------- Stage 3: OCR (worker process) ---------------
+def ocr_page(img):
+    t0 = time.perf_counter()
+    text = pytesseract.image_to_string(img)
+    return text, time.perf_counter() - t0
+
+# --------------- Stage 2: text layer / render + collect ---------------
+class PaperResult:
+    """Collects extracted pages of one paper and writes the text file once all arrive."""
+
+    def __init__(self, paper_id, txt_path, n_pages):
+        self.paper_id = paper_id
+        self.txt_path = txt_path
+        self.pages = [""] * n_pages
+        self.remaining = n_pages
+        self.lock = threading.Lock()
+        if n_pages == 0:
+            # nothing will ever call page_done: write the (empty) file now so the paper counts as done
+            print(f"[!] {paper_id} has no pages")
+            self.write()
+
+    def page_done(self, i, text):
+        with self.lock:
+            self.pages[i] = text
+            self.remaining -= 1
+            if self.remaining:
+                return
+        self.write()
+
+    def write(self):
+        full_text = "".join(f"\n--- Page {i + 1} ---\n{t}" for i, t in enumerate(self.pages))
+        with open(self.txt_path, "w", encoding="utf-8") as f:
+            f.write(full_text)
+        print(f"[✓] OCR saved to {self.txt_path}")
+
+def render_stage(in_q, pool, timer, cache):
+    slots = threading.BoundedSemaphore(MAX_PAGES_IN_FLIGHT)
+
+    def on_done(fut, result, digest, i, layer_text):
+        slots.release()
+        try:
+            text, secs = fut.result()
+            timer.add("ocr", secs)
+            cache.put(digest, i + 1, "ocr", text)
+        except Exception as e:
+            # Keep the text layer but don't cache it, so OCR is retried next run (as pdf_extract does)
+            print(f"[!] OCR error for {result.paper_id} page {i + 1}: {e}")
+            text = layer_text
+        result.page_done(i, text)
+
+    while (job := in_q.get()) is not None:
+        paper_id, pdf_path, txt_path = job
+        try:
+            digest = pdf_extract.pdf_hash(pdf_path)
+            cached = cache.get_all(digest)
+            doc = fitz.open(pdf_path)
+        except Exception as e:
+            print(f"[!] PDF conversion error for {paper_id}: {e}")
+            continue
+
+        with doc:
+            result = PaperResult(paper_id, txt_path, doc.page_count)
+            for i, page in enumerate(doc):
+                if i + 1 in cached:
+                    result.page_done(i, cached[i + 1][1])
+                    continue
+
+                # Native text layer first; only scanned/garbled pages go to OCR
+                t0 = time.perf_counter()
+                text = page.get_text("text")
+                timer.add("text", time.perf_counter() - t0)
+                if not pdf_extract.needs_ocr(text, page.rect):
+                    cache.put(digest, i + 1, "text", text)
+                    result.page_done(i, text)
+                    continue
+
+                # Render one page at a time; wait while too many bitmaps are queued for OCR
+                slots.acquire()
+                t0 = time.perf_counter()
+                try:
+                    img = convert_from_path(pdf_path, dpi=DPI, first_page=i + 1, last_page=i + 1)[0]
+                except Exception as e:
+                    slots.release()
+                    print(f"[!] PDF conversion error for {paper_id} page {i + 1}: {e}")
+                    result.page_done(i, text)
+                    continue
+                timer.add("render", time.perf_counter() - t0)
+                fut = pool.submit(ocr_page, img)
+                del img
+                fut.add_done_callback(lambda f, r=result, d=digest, i=i, t=text: on_done(f, r, d, i, t))
+
+# --------------- Pipeline ---------------
+def main():
+    # Setup folders
+    os.makedirs("pdfs", exist_ok=True)
+    os.makedirs("pdf_ocr", exist_ok=True)
+
+    # Load paper metadata from Task 1
+    with open("arxiv_clean.json", "r", encoding="utf-8") as f:
+        papers = json.load(f)
+
+    cache = pdf_extract.PageCache(PAGE_CACHE)
+    timer = StageTimer()
+    t0 = time.perf_counter()
+    pdf_q = queue.Queue(maxsize=DOWNLOAD_AHEAD)
+    downloader = threading.Thread(target=download_stage, args=(papers, pdf_q, timer), daemon=True)
+    downloader.start()
+
+    with ProcessPoolExecutor(max_workers=OCR_WORKERS) as pool:
+        render_stage(pdf_q, pool, timer, cache)
+    downloader.join()
+    cache.close()
+
+    print(timer.report(time.perf_counter() - t0))
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 import os
+import glob
 import json
+import argparse
+import threading
+import multiprocessing as mp
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import numpy as np
 import whisper
-from yt_dlp import YoutubeDL
 
 # Paths
 ffmpeg_path = r"asd/ffmpeg/bin"
@@ -15,56 +20,277 @@ video_urls = [
     "https://www.youtube.com/watch?v=P3icxlpgPhE"
 ]
 
-# GPU-aware Whisper model
-import torch
-device = "cuda" if torch.cuda.is_available() else "cpu"
-model = whisper.load_model("base", device=device)
+MODEL_NAME = "base"
+FETCH_THREADS = 2           # downloads/decodes running ahead of the model workers
+FETCH_AHEAD = 2 * FETCH_THREADS   # talks fetched but not yet handed to the workers (~230 MB of .npy per audio hour)
+AUDIO_EXTS = (".mp3", ".wav", ".m4a", ".webm", ".flac", ".ogg", ".opus")
+SAMPLE_RATE = 16000
 
-# Make folders
-os.makedirs(audio_dir, exist_ok=True)
-os.makedirs("talks_transcripts", exist_ok=True)
+# Chunked mode: cut long audio at quiet points and transcribe chunks in parallel
+CHUNK_MIN_S = 20
+CHUNK_MAX_S = 90
+VAD_FRAME_MS = 30
+VAD_SMOOTH_FRAMES = 10      # ~300 ms moving average when looking for the quietest cut
+VAD_SILENCE_DB = -35.0      # frames this far below the loud (95th pct) level count as silence
+VAD_FLOOR_DBFS = -60.0      # frames below this absolute level are silent too (all-quiet recordings)
 
 def get_audio_filename(url):
     vid_id = url.split("v=")[-1]
-    return os.path.join(audio_dir, f"{vid_id}.mp3"), vid_id
+    existing = [p for p in glob.glob(os.path.join(audio_dir, f"{vid_id}.*"))
+                if p.lower().endswith(AUDIO_EXTS)]
+    return (existing[0] if existing else None), vid_id
 
 def download_audio(url):
+    """Fetch the native audio stream (no mp3 re-encode); ffmpeg decodes it to PCM later."""
+    from yt_dlp import YoutubeDL  # only needed for YouTube sources, not --audio-dir
     filepath, vid_id = get_audio_filename(url)
-    if os.path.exists(filepath):
+    if filepath:
         print(f"[~] Skipping download, found: {filepath}")
         return filepath, vid_id
     ydl_opts = {
         'ffmpeg_location': ffmpeg_path,
         'format': 'bestaudio/best',
-        'outtmpl': filepath.replace(".mp3", "") + ".%(ext)s",
-        'postprocessors': [{
-            'key': 'FFmpegExtractAudio',
-            'preferredcodec': 'mp3',
-            'preferredquality': '192',
-        }],
+        'outtmpl': os.path.join(audio_dir, vid_id) + ".%(ext)s",
         'quiet': True,
     }
     with YoutubeDL(ydl_opts) as ydl:
-        ydl.download([url])
+        info = ydl.extract_info(url, download=True)
+        filepath = ydl.prepare_filename(info)
     return filepath, vid_id
 
-with open(transcript_path, "w", encoding="utf-8") as outfile:
-    for url in video_urls:
-        try:
-            audio_path, vid_id = download_audio(url)
-            print(f"[🎙️] Transcribing {vid_id} ...")
-            result = model.transcribe(audio_path)
-            if "segments" in result:
-                data = {
-                    "video_id": vid_id,
-                    "url": url,
-                    "segments": result["segments"],
-                    "text": result["text"]
-                }
+# --------------- Energy VAD chunking ---------------
+def split_on_silence(audio, min_s=CHUNK_MIN_S, max_s=CHUNK_MAX_S, sr=SAMPLE_RATE):
+    """
+    Return [(start, end)] sample ranges of at most max_s seconds, each cut at the
+    quietest point (smoothed frame energy) between min_s and max_s (min_s is
+    clamped to max_s). Chunks with no frame above the silence threshold are dropped.
+    """
+    min_s = min(min_s, max_s)
+    frame = sr * VAD_FRAME_MS // 1000
+    n = len(audio) // frame
+    if n == 0:
+        return [(0, len(audio))]
+
+    frames = np.asarray(audio[: n * frame], dtype=np.float32).reshape(n, frame)
+    db = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    silent = (db < np.percentile(db, 95) + VAD_SILENCE_DB) | (db < VAD_FLOOR_DBFS)
+    smooth = np.convolve(db, np.ones(VAD_SMOOTH_FRAMES) / VAD_SMOOTH_FRAMES, mode="same")
+
+    min_f = max(1, int(min_s * 1000 / VAD_FRAME_MS))
+    max_f = max(min_f + 1, int(max_s * 1000 / VAD_FRAME_MS))
+    cuts, start = [], 0
+    while n - start > max_f:
+        lo, hi = start + min_f, start + max_f
+        cut = lo + int(np.argmin(smooth[lo:hi]))
+        cuts.append((start, cut))
+        start = cut
+    cuts.append((start, n))
+
+    bounds = [(a * frame, b * frame) for a, b in cuts]
+    bounds[-1] = (bounds[-1][0], len(audio))   # keep the sub-frame tail
+    return [r for r, (a, b) in zip(bounds, cuts) if not silent[a:b].all()]
+
+def stitch_segments(chunks):
+    """Merge per-chunk [(offset_s, result)] into one result with absolute timestamps."""
+    segments, texts = [], []
+    for offset, result in chunks:
+        for seg in result["segments"]:
+            seg = dict(seg, id=len(segments), seek=seg["seek"] + int(round(offset * 100)),
+                       start=seg["start"] + offset, end=seg["end"] + offset)
+            if "words" in seg:
+                seg["words"] = [dict(w, start=w["start"] + offset, end=w["end"] + offset) for w in seg["words"]]
+            segments.append(seg)
+        texts.append(result["text"])
+    return {"segments": segments, "text": "".join(texts)}
+
+# --------------- Sources + resume index ---------------
+def iter_sources(local_dir=None):
+    """Yield (video_id, url) from YouTube URLs, or from audio files in `local_dir`."""
+    if local_dir:
+        for name in sorted(os.listdir(local_dir)):
+            if name.lower().endswith(AUDIO_EXTS):
+                yield os.path.splitext(name)[0], os.path.join(local_dir, name)
+    else:
+        for url in video_urls:
+            yield url.split("v=")[-1], url
+
+def load_done_ids(path):
+    """video_ids already present in the transcripts JSONL."""
+    done = set()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["video_id"])
+                except (json.JSONDecodeError, KeyError):
+                    continue
+    return done
+
+# --------------- Producer: fetch + decode ---------------
+def fetch_and_decode(vid_id, url, local):
+    """Download (unless local) and decode to 16 kHz mono float32, cached as .npy."""
+    audio_path = url if local else download_audio(url)[0]
+    npy_path = os.path.join(audio_dir, f"{vid_id}.npy")
+    if not os.path.exists(npy_path):
+        tmp_path = npy_path + ".part"
+        with open(tmp_path, "wb") as f:
+            np.save(f, whisper.load_audio(audio_path))
+        os.replace(tmp_path, npy_path)
+    return vid_id, url, npy_path
+
+def remove_decoded(npy_path):
+    try:
+        os.remove(npy_path)
+    except OSError:
+        pass
+
+# --------------- Consumers: model workers ---------------
+_model = None
+
+def _init_worker(model_name, device, threads):
+    global _model
+    import torch
+    if threads:
+        torch.set_num_threads(threads)
+    _model = whisper.load_model(model_name, device=device)
+
+def transcribe_range(npy_path, start, end):
+    """Transcribe audio[start:end] of a decoded .npy file (one chunk, or the whole talk)."""
+    audio = np.load(npy_path, mmap_mode="r")
+    result = _model.transcribe(np.array(audio[start:end]), fp16=(_model.device.type == "cuda"))
+    return {"segments": result.get("segments", []), "text": result.get("text", "")}
+
+class VideoJob:
+    """Collects chunk results for one video and writes its line once all have arrived."""
+
+    def __init__(self, vid_id, url, npy_path, ranges):
+        self.vid_id = vid_id
+        self.url = url
+        self.npy_path = npy_path
+        self.offsets = [start / SAMPLE_RATE for start, _ in ranges]
+        self.results = [None] * len(ranges)
+        self.remaining = len(ranges)
+        self.failed = False
+        self.lock = threading.Lock()
+
+    def chunk_done(self, i, result):
+        """Store one chunk; return True when this was the last outstanding chunk."""
+        with self.lock:
+            if result is None:
+                self.failed = True
+            else:
+                self.results[i] = result
+            self.remaining -= 1
+            return self.remaining == 0
+
+    def record(self):
+        stitched = stitch_segments(zip(self.offsets, self.results))
+        return {
+            "video_id": self.vid_id,
+            "url": self.url,
+            "segments": stitched["segments"],
+            "text": stitched["text"]
+        }
+
+# --------------- Pipeline ---------------
+def main():
+    import torch
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--audio-dir", help="transcribe local audio files instead of YouTube")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="model worker processes (default: 1 on GPU, cores/4 on CPU)")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--out", default=transcript_path)
+    parser.add_argument("--chunked", action="store_true",
+                        help="split long audio on silence and transcribe chunks in parallel")
+    parser.add_argument("--chunk-max-s", type=float, default=CHUNK_MAX_S)
+    args = parser.parse_args()
+    if args.chunk_max_s < CHUNK_MIN_S:
+        parser.error(f"--chunk-max-s must be at least {CHUNK_MIN_S} seconds")
+
+    # GPU-aware Whisper model
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    cores = os.cpu_count() or 1
+    workers = args.workers or (1 if device == "cuda" else max(1, cores // 4))
+    threads = 0 if device == "cuda" else max(1, cores // workers)
+
+    # Make folders
+    os.makedirs(audio_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+
+    done = load_done_ids(args.out)
+    todo = [(v, u) for v, u in iter_sources(args.audio_dir) if v not in done]
+    print(f"[~] {len(done)} already transcribed, {len(todo)} to go, {workers} model worker(s) on {device}")
+
+    write_lock = threading.Lock()
+    slots = threading.BoundedSemaphore(workers * 2)   # chunks queued ahead of the workers
+
+    with open(args.out, "a", encoding="utf-8") as outfile, \
+         ThreadPoolExecutor(max_workers=FETCH_THREADS) as fetchers, \
+         ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                             initializer=_init_worker, initargs=(args.model, device, threads)) as pool:
+
+        def on_done(fut, job, i):
+            slots.release()
+            try:
+                result = fut.result()
+            except Exception as e:
+                print(f"[!] Error with {job.vid_id} chunk {i}: {e}")
+                result = None
+            if not job.chunk_done(i, result):
+                return
+            if job.failed:
+                print(f"[!] {job.vid_id} incomplete, will retry next run")
+                return
+            data = job.record()
+            if not data["segments"]:
+                print(f"[!] No segments for {job.vid_id}")
+                return
+            with write_lock:
                 json.dump(data, outfile)
                 outfile.write("\n")
-                print(f"[✓] Done: {vid_id}")
-            else:
-                print(f"[!] No segments for {vid_id}")
-        except Exception as e:
-            print(f"[!] Error with {url}: {e}")
+                outfile.flush()   # each finished line is the resume index
+            remove_decoded(job.npy_path)
+            print(f"[✓] Done: {job.vid_id}")
+
+        # Only FETCH_AHEAD talks are downloaded/decoded ahead of transcription; the next
+        # fetch is submitted as each finished one is taken (slots throttle that loop)
+        sources = iter(todo)
+        pending = set()
+
+        def fetch_next():
+            source = next(sources, None)
+            if source is not None:
+                pending.add(fetchers.submit(fetch_and_decode, *source, bool(args.audio_dir)))
+
+        for _ in range(FETCH_AHEAD):
+            fetch_next()
+        while pending:
+            done_fetches, pending = wait(pending, return_when=FIRST_COMPLETED)
+            while done_fetches:
+                fetch = done_fetches.pop()
+                fetch_next()
+                try:
+                    vid_id, url, npy_path = fetch.result()
+                except Exception as e:
+                    print(f"[!] Fetch/decode error: {e}")
+                    continue
+
+                audio = np.load(npy_path, mmap_mode="r")
+                n_samples = len(audio)
+                ranges = split_on_silence(audio, max_s=args.chunk_max_s) if args.chunked else [(0, n_samples)]
+                del audio
+                if not ranges:
+                    print(f"[!] Only silence in {vid_id}")
+                    remove_decoded(npy_path)
+                    continue
+
+                job = VideoJob(vid_id, url, npy_path, ranges)
+                print(f"[🎙️] Transcribing {vid_id} ({n_samples / SAMPLE_RATE:.0f}s, {len(ranges)} chunk(s)) ...")
+                for i, (start, end) in enumerate(ranges):
+                    slots.acquire()
+                    fut = pool.submit(transcribe_range, npy_path, start, end)
+                    fut.add_done_callback(lambda f, j=job, i=i: on_done(f, j, i))
+
+if __name__ == "__main__":
+    main()
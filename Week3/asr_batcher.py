@@ -0,0 +1,139 @@
+"""
+Micro-batching scheduler for Whisper.
+
+Requests are queued; a scheduler thread per model replica takes the first waiting
+utterance, keeps collecting for up to `max_wait_ms` (or until `max_batch`), then
+runs one batched log-mel + encoder/decoder pass and resolves each request's Future.
+
+Only utterances that fit one 30 s window are batched (the /chat case). Longer
+audio, and items whose greedy pass trips Whisper's usual quality checks, go
+through model.transcribe() so results match the unbatched path.
+"""
+from concurrent.futures import Future
+import queue, threading, time
+
+import numpy as np
+import torch
+import whisper
+from whisper.audio import HOP_LENGTH, N_FFT, N_SAMPLES, mel_filters
+
+# Same thresholds model.transcribe() uses to decide a greedy decode needs a retry
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+def batch_log_mel(audios: list[np.ndarray], n_mels: int, device) -> torch.Tensor:
+    """(B, n_mels, 3000) log-mel of 30 s windows; one STFT for the whole batch."""
+    x = torch.from_numpy(np.stack([whisper.pad_or_trim(a) for a in audios])).to(device)
+    window = torch.hann_window(N_FFT, device=x.device)
+    stft = torch.stft(x, N_FFT, HOP_LENGTH, window=window, return_complex=True)
+    mel = mel_filters(x.device, n_mels) @ (stft[..., :-1].abs() ** 2)
+    log_spec = torch.clamp(mel, min=1e-10).log10()
+    # whisper normalises against each clip's own peak, not the batch's
+    log_spec = torch.maximum(log_spec, log_spec.amax(dim=(-2, -1), keepdim=True) - 8.0)
+    return (log_spec + 4.0) / 4.0
+
+class WhisperBatcher:
+    def __init__(self, models: "queue.Queue[whisper.Whisper]", n_schedulers: int,
+                 max_batch: int, max_wait_ms: float, fp16: bool = False):
+        self.models = models
+        self.max_batch = max_batch
+        self.max_wait_s = max_wait_ms / 1000
+        self.fp16 = fp16
+        self.requests: "queue.Queue[tuple[np.ndarray, Future] | None]" = queue.Queue()
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.fallbacks = 0
+        self.threads = [threading.Thread(target=self._loop, name=f"asr-batch-{i}", daemon=True)
+                        for i in range(n_schedulers)]
+        for t in self.threads:
+            t.start()
+
+    def submit(self, audio: np.ndarray) -> Future:
+        fut = Future()
+        self.requests.put((audio, fut))
+        return fut
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        return self.submit(audio).result()
+
+    def close(self):
+        for _ in self.threads:
+            self.requests.put(None)
+        for t in self.threads:
+            t.join()
+
+    def _collect(self) -> list | None:
+        first = self.requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_s
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.requests.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self.requests.put(None)   # leave the stop signal for this thread's next round
+                break
+            batch.append(item)
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            model = self.models.get()
+            try:
+                self._run(model, batch)
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+            finally:
+                self.models.put(model)
+
+    def _run(self, model: whisper.Whisper, batch: list):
+        short = [(a, f) for a, f in batch if len(a) <= N_SAMPLES]
+        retry = [(a, f) for a, f in batch if len(a) > N_SAMPLES]
+
+        if short:
+            mel = batch_log_mel([a for a, _ in short], model.dims.n_mels, model.device)
+            if self.fp16:
+                mel = mel.half()
+            options = whisper.DecodingOptions(without_timestamps=True, fp16=self.fp16)
+            for (audio, fut), res in zip(short, whisper.decode(model, mel, options)):
+                if res.no_speech_prob > NO_SPEECH_THRESHOLD and res.avg_logprob < LOGPROB_THRESHOLD:
+                    fut.set_result("")
+                elif (res.compression_ratio > COMPRESSION_RATIO_THRESHOLD
+                      or res.avg_logprob < LOGPROB_THRESHOLD):
+                    retry.append((audio, fut))
+                else:
+                    fut.set_result(res.text.strip())
+
+        for audio, fut in retry:
+            out = model.transcribe(audio, fp16=self.fp16)
+            fut.set_result((out.get("text") or "").strip())
+
+        with self.lock:
+            self.batches += 1
+            self.items += len(batch)
+            self.fallbacks += len(retry)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait_s * 1000,
+                "queued": self.requests.qsize(),
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch": round(self.items / self.batches, 2) if self.batches else None,
+                "fallbacks": self.fallbacks,
+            }
@@ -0,0 +1,103 @@
+"""
+Transcription cache keyed by a hash of the uploaded audio bytes (+ model name).
+
+Retries and canned prompts resend byte-identical audio; a hit skips decoding and
+the Whisper pass entirely. In-memory LRU bounded by entry count, optionally backed
+by a SQLite file so hits survive restarts and are shared across workers.
+"""
+from collections import OrderedDict
+import hashlib, sqlite3, threading, time
+
+class TranscriptCache:
+    PRUNE_EVERY = 256   # disk writes between size checks
+
+    def __init__(self, model_name: str, max_entries: int, path: str | None = None):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.path = path
+        self.mem: "OrderedDict[str, str]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+        if path:
+            self._con().execute("""
+                CREATE TABLE IF NOT EXISTS transcripts (
+                    key     TEXT PRIMARY KEY,
+                    text    TEXT NOT NULL,
+                    used_at REAL NOT NULL
+                )
+            """)
+
+    def _con(self) -> sqlite3.Connection:
+        con = getattr(self.local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self.local.con = con
+        return con
+
+    def key(self, audio_bytes: bytes) -> str:
+        h = hashlib.sha256(audio_bytes)
+        h.update(self.model_name.encode())
+        return h.hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self.lock:
+            text = self.mem.get(key)
+            if text is not None:
+                self.mem.move_to_end(key)
+                self.hits += 1
+                return text
+        if self.path:
+            con = self._con()
+            row = con.execute("SELECT text FROM transcripts WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                con.execute("UPDATE transcripts SET used_at = ? WHERE key = ?", (time.time(), key))
+                self._remember(key, row[0])
+                with self.lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                return row[0]
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, text: str):
+        self._remember(key, text)
+        if self.path:
+            con = self._con()
+            con.execute("INSERT OR REPLACE INTO transcripts(key, text, used_at) VALUES (?, ?, ?)",
+                        (key, text, time.time()))
+            with self.lock:
+                self.writes += 1
+                prune = self.writes % self.PRUNE_EVERY == 0
+            if prune:
+                con.execute("""
+                    DELETE FROM transcripts WHERE key IN (
+                        SELECT key FROM transcripts ORDER BY used_at DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_entries,))
+
+    def _remember(self, key: str, text: str):
+        with self.lock:
+            self.mem[key] = text
+            self.mem.move_to_end(key)
+            while len(self.mem) > self.max_entries:
+                self.mem.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.mem),
+                "max_entries": self.max_entries,
+                "persistent": bool(self.path),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+            }
@@ -0,0 +1,106 @@
+# bench_asr_batch.py
+# Latency/throughput of the Whisper micro-batcher vs. batch window.
+#
+# N closed-loop clients each send the clip back to back; for every window we report
+# utterances/s (also per CPU thread), p50/p99 latency and the mean batch size the
+# scheduler actually formed. "off" is one transcribe() per request (ASR_BATCH_MAX=1).
+#
+#   python bench_asr_batch.py                                  # tiny, 8 clients
+#   python bench_asr_batch.py --model base --clients 16 --windows 0 10 25 50
+
+import argparse
+import queue
+import threading
+import time
+
+import numpy as np
+import torch
+import whisper
+
+from asr_batcher import WhisperBatcher
+
+SAMPLE_RATE = whisper.audio.SAMPLE_RATE
+
+def load_clip(path: str) -> np.ndarray:
+    try:
+        import soundfile as sf
+        data, sr = sf.read(path, dtype="float32", always_2d=True)
+        if sr == SAMPLE_RATE:
+            return data.mean(axis=1)
+    except Exception:
+        pass
+    return whisper.load_audio(path)
+
+def run(transcribe, audio: np.ndarray, clients: int, total: int) -> dict:
+    lat, lock = [], threading.Lock()
+    remaining = iter(range(total))
+
+    def client():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            t0 = time.perf_counter()
+            transcribe(audio)
+            with lock:
+                lat.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    lat.sort()
+    return {
+        "utt_s": total / wall,
+        "p50_ms": lat[len(lat) // 2] * 1000,
+        "p99_ms": lat[min(len(lat) - 1, int(0.99 * len(lat)))] * 1000,
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="tiny")
+    ap.add_argument("--audio", default="test.wav")
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=48)
+    ap.add_argument("--max-batch", type=int, default=8)
+    ap.add_argument("--windows", type=float, nargs="+", default=[0, 5, 10, 25, 50], help="max wait, ms")
+    args = ap.parse_args()
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    fp16 = device == "cuda"
+    cpus = 1 if device == "cuda" else torch.get_num_threads()
+    model = whisper.load_model(args.model, device=device)
+    models = queue.Queue()
+    models.put(model)
+    audio = load_clip(args.audio)
+    print(f"{args.model} on {device}, {len(audio) / SAMPLE_RATE:.1f}s clip, "
+          f"{args.clients} clients, {args.requests} requests per row\n")
+
+    model.transcribe(audio, fp16=fp16)   # warm-up
+
+    def serial(a):
+        m = models.get()
+        try:
+            return m.transcribe(a, fp16=fp16)["text"]
+        finally:
+            models.put(m)
+
+    print(f"{'window':>8} {'utt/s':>7} {'utt/s/cpu':>10} {'p50 ms':>8} {'p99 ms':>8} {'batch':>6}")
+    r = run(serial, audio, args.clients, args.requests)
+    print(f"{'off':>8} {r['utt_s']:>7.2f} {r['utt_s'] / cpus:>10.3f} {r['p50_ms']:>8.0f} {r['p99_ms']:>8.0f} {1:>6}")
+
+    for window in args.windows:
+        batcher = WhisperBatcher(models, 1, args.max_batch, window, fp16=fp16)
+        r = run(batcher.transcribe, audio, args.clients, args.requests)
+        st = batcher.stats()
+        batcher.close()
+        print(f"{window:>6.0f}ms {r['utt_s']:>7.2f} {r['utt_s'] / cpus:>10.3f} {r['p50_ms']:>8.0f} "
+              f"{r['p99_ms']:>8.0f} {st['mean_batch']:>6}")
+        if st["fallbacks"]:
+            print(f"{'':>8} ({st['fallbacks']} item(s) re-run through transcribe() after quality checks)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Conversation history backends for the voice assistant.
+
+- MemoryStore: per-process LRU + TTL, bounded number of conversations.
+- SQLiteStore: WAL-mode SQLite file shared by every uvicorn worker on the host.
+
+Both keep at most `max_messages` per conversation. That is only a safety bound on
+storage, set above anything the token budget can admit: `trim_to_budget` alone
+decides how much history goes to the LLM, newest messages first.
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+import sqlite3, threading, time
+
+try:
+    import tiktoken
+    _enc = tiktoken.get_encoding("o200k_base")   # gpt-4o family
+except Exception:
+    _enc = None
+
+MESSAGE_OVERHEAD_TOKENS = 4   # role/separator tokens per chat message
+
+# =========================
+# Token budget
+# =========================
+def count_tokens(text: str) -> int:
+    if _enc is None:
+        return max(1, len(text) // 4)   # ~4 chars/token heuristic
+    return len(_enc.encode(text))
+
+def trim_to_budget(messages: list[dict], budget: int) -> list[dict]:
+    """Keep the most recent messages whose combined token count fits in `budget`."""
+    kept, used = [], 0
+    for msg in reversed(messages):
+        used += count_tokens(msg["content"]) + MESSAGE_OVERHEAD_TOKENS
+        if used > budget:
+            break
+        kept.append(msg)
+    kept.reverse()
+    return kept
+
+# =========================
+# Backends
+# =========================
+class ConversationStore(ABC):
+    @abstractmethod
+    def get(self, conversation_id: str) -> list[dict]:
+        """Stored messages of the conversation, oldest first ([] if unknown or expired)."""
+
+    @abstractmethod
+    def append(self, conversation_id: str, messages: list[dict]):
+        """Add messages to the conversation and refresh its TTL."""
+
+    @abstractmethod
+    def clear(self, conversation_id: str):
+        """Drop the conversation and all its messages."""
+
+    @abstractmethod
+    def stats(self) -> dict:
+        """Backend name and size counters for /metrics."""
+
+class MemoryStore(ConversationStore):
+    """In-process LRU of conversations; entries idle longer than `ttl_s` expire."""
+
+    def __init__(self, max_conversations: int, ttl_s: float, max_messages: int):
+        self.max_conversations = max_conversations
+        self.ttl_s = ttl_s
+        self.max_messages = max_messages
+        self.data: "OrderedDict[str, tuple[float, deque]]" = OrderedDict()
+        self.evicted = 0
+        self.expired = 0
+        self.lock = threading.Lock()
+
+    def _expire(self, now: float):
+        # OrderedDict is in access order, so idle entries sit at the front
+        while self.data:
+            cid, (ts, _) = next(iter(self.data.items()))
+            if now - ts < self.ttl_s:
+                break
+            del self.data[cid]
+            self.expired += 1
+
+    def get(self, conversation_id: str) -> list[dict]:
+        now = time.monotonic()
+        with self.lock:
+            self._expire(now)
+            entry = self.data.get(conversation_id)
+            if entry is None:
+                return []
+            self.data[conversation_id] = (now, entry[1])
+            self.data.move_to_end(conversation_id)
+            return list(entry[1])
+
+    def append(self, conversation_id: str, messages: list[dict]):
+        now = time.monotonic()
+        with self.lock:
+            self._expire(now)
+            entry = self.data.pop(conversation_id, None)
+            history = entry[1] if entry else deque(maxlen=self.max_messages)
+            history.extend(messages)
+            self.data[conversation_id] = (now, history)
+            while len(self.data) > self.max_conversations:
+                self.data.popitem(last=False)
+                self.evicted += 1
+
+    def clear(self, conversation_id: str):
+        with self.lock:
+            self.data.pop(conversation_id, None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"backend": "memory", "conversations": len(self.data),
+                    "max_conversations": self.max_conversations,
+                    "evicted": self.evicted, "expired": self.expired}
+
+class SQLiteStore(ConversationStore):
+    """
+    WAL-mode SQLite store: survives restarts and is shared by multiple worker
+    processes. One connection per thread; idle conversations are purged lazily.
+    """
+
+    PURGE_EVERY = 500   # appends between TTL sweeps
+
+    def __init__(self, path: str, ttl_s: float, max_messages: int):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_messages = max_messages
+        self.local = threading.local()
+        self.appends = 0
+        con = self._con()
+        con.executescript("""
+            CREATE TABLE IF NOT EXISTS conversations (
+                conversation_id TEXT PRIMARY KEY,
+                updated_at      REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                seq             INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL,
+                role            TEXT NOT NULL,
+                content         TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS messages_by_convo ON messages(conversation_id, seq);
+            CREATE INDEX IF NOT EXISTS convo_by_age ON conversations(updated_at);
+        """)
+
+    def _con(self) -> sqlite3.Connection:
+        con = getattr(self.local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self.local.con = con
+        return con
+
+    def get(self, conversation_id: str) -> list[dict]:
+        con = self._con()
+        row = con.execute("SELECT updated_at FROM conversations WHERE conversation_id = ?",
+                          (conversation_id,)).fetchone()
+        if row is None or time.time() - row[0] >= self.ttl_s:
+            return []
+        rows = con.execute(
+            "SELECT role, content FROM messages WHERE conversation_id = ? ORDER BY seq",
+            (conversation_id,),
+        ).fetchall()
+        return [{"role": r, "content": c} for r, c in rows]
+
+    def append(self, conversation_id: str, messages: list[dict]):
+        con = self._con()
+        now = time.time()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            row = con.execute("SELECT updated_at FROM conversations WHERE conversation_id = ?",
+                              (conversation_id,)).fetchone()
+            if row is not None and now - row[0] >= self.ttl_s:
+                con.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+            con.execute(
+                "INSERT INTO conversations(conversation_id, updated_at) VALUES (?, ?) "
+                "ON CONFLICT(conversation_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (conversation_id, now),
+            )
+            con.executemany(
+                "INSERT INTO messages(conversation_id, role, content) VALUES (?, ?, ?)",
+                [(conversation_id, m["role"], m["content"]) for m in messages],
+            )
+            con.execute("""
+                DELETE FROM messages WHERE conversation_id = ? AND seq NOT IN (
+                    SELECT seq FROM messages WHERE conversation_id = ? ORDER BY seq DESC LIMIT ?
+                )
+            """, (conversation_id, conversation_id, self.max_messages))
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        self.appends += 1
+        if self.appends % self.PURGE_EVERY == 0:
+            self.purge_expired()
+
+    def purge_expired(self):
+        con = self._con()
+        cutoff = time.time() - self.ttl_s
+        con.execute("BEGIN IMMEDIATE")
+        con.execute("DELETE FROM messages WHERE conversation_id IN "
+                    "(SELECT conversation_id FROM conversations WHERE updated_at < ?)", (cutoff,))
+        con.execute("DELETE FROM conversations WHERE updated_at < ?", (cutoff,))
+        con.execute("COMMIT")
+
+    def clear(self, conversation_id: str):
+        con = self._con()
+        con.execute("BEGIN IMMEDIATE")
+        con.execute("DELETE FROM messages WHERE conversation_id = ?", (conversation_id,))
+        con.execute("DELETE FROM conversations WHERE conversation_id = ?", (conversation_id,))
+        con.execute("COMMIT")
+
+    def stats(self) -> dict:
+        n = self._con().execute("SELECT COUNT(*) FROM conversations").fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "conversations": n}
+
+def make_store(backend: str, *, path: str, max_conversations: int, ttl_s: float, max_messages: int) -> ConversationStore:
+    if backend == "sqlite":
+        return SQLiteStore(path, ttl_s, max_messages)
+    if backend == "memory":
+        return MemoryStore(max_conversations, ttl_s, max_messages)
+    raise ValueError(f"Unknown CONVO_BACKEND: {backend!r} (use 'memory' or 'sqlite')")
@@ -0,0 +1,183 @@
+# load_test.py
+# Load test for /chat/ against a local fake OpenAI-compatible LLM server.
+#
+# Starts the fake LLM (fixed latency), launches `uvicorn main:app` pointed at it via
+# OPENAI_BASE_URL, then fires concurrent /chat/ requests with test.wav (debug JSON,
+# no TTS) at increasing concurrency and prints throughput + latency per level.
+# With --stream it hits /chat/stream instead (fake LLM streams tokens over SSE) and
+# also reports time-to-first-audio-byte.
+#
+#   python load_test.py                         # ASR_MODEL=tiny, levels 1 2 4 8
+#   python load_test.py --levels 1 4 16 --llm-latency 0.8 --requests 32
+#   python load_test.py --stream --levels 1 --token-delay 0.05
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# -------------------- Fake LLM --------------------
+def make_llm_handler(latency_s: float, token_delay_s: float):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            time.sleep(latency_s)
+            user = next((m["content"] for m in reversed(body.get("messages", [])) if m["role"] == "user"), "")
+            reply = (f"You said: {user[:80]}. This is a canned reply from the fake LLM. "
+                     "It has a few sentences so streaming can start early. Thanks for testing!")
+            if body.get("stream"):
+                self.stream_reply(body, reply)
+                return
+            payload = json.dumps({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": reply}}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def stream_reply(self, body: dict, reply: str):
+            """OpenAI-style SSE: one chat.completion.chunk per word, then [DONE]."""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def send(data: str):
+                raw = f"data: {data}\n\n".encode()
+                self.wfile.write(f"{len(raw):X}\r\n".encode() + raw + b"\r\n")
+                self.wfile.flush()
+
+            words = reply.split(" ")
+            for i, w in enumerate(words):
+                delta = {"content": w + (" " if i < len(words) - 1 else "")}
+                send(json.dumps({
+                    "id": "chatcmpl-fake", "object": "chat.completion.chunk",
+                    "created": int(time.time()), "model": body.get("model", "fake"),
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+                }))
+                time.sleep(token_delay_s)
+            send("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+
+    return Handler
+
+def start_fake_llm(latency_s: float, token_delay_s: float = 0.03) -> ThreadingHTTPServer:
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), make_llm_handler(latency_s, token_delay_s))
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+# -------------------- App server --------------------
+def start_app(port: int, llm_port: int, env_overrides: dict) -> subprocess.Popen:
+    env = dict(os.environ,
+               OPENAI_BASE_URL=f"http://127.0.0.1:{llm_port}/v1",
+               OPENAI_API_KEY="fake",
+               **env_overrides)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env=env,
+    )
+    deadline = time.time() + 300
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/metrics", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            time.sleep(0.5)
+    proc.kill()
+    raise RuntimeError("app did not start")
+
+# -------------------- Load --------------------
+async def run_level(base: str, audio: bytes, concurrency: int, total: int, stream: bool = False) -> dict:
+    lat, first = [], []
+    sem = asyncio.Semaphore(concurrency)
+    params = {} if stream else {"debug": "true", "play": "false", "speak_when_debug": "false"}
+    path = "/chat/stream" if stream else "/chat/"
+
+    async with httpx.AsyncClient(timeout=300) as http:
+        async def one(i):
+            async with sem:
+                t0 = time.perf_counter()
+                async with http.stream("POST", f"{base}{path}",
+                                       params={**params, "conversation_id": f"load-{i}"},
+                                       files={"file": ("test.wav", audio, "audio/wav")}) as r:
+                    r.raise_for_status()
+                    got_first = False
+                    async for _ in r.aiter_raw():
+                        if not got_first:
+                            first.append(time.perf_counter() - t0)
+                            got_first = True
+                lat.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        wall = time.perf_counter() - t0
+
+    lat.sort()
+    first.sort()
+    return {
+        "concurrency": concurrency,
+        "req_s": total / wall,
+        "p50_ms": lat[len(lat) // 2] * 1000,
+        "p95_ms": lat[min(len(lat) - 1, int(0.95 * len(lat)))] * 1000,
+        "first_byte_p50_ms": first[len(first) // 2] * 1000,
+    }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8])
+    ap.add_argument("--requests", type=int, default=16, help="requests per level")
+    ap.add_argument("--llm-latency", type=float, default=0.5)
+    ap.add_argument("--token-delay", type=float, default=0.03, help="fake LLM delay per streamed word")
+    ap.add_argument("--stream", action="store_true", help="load /chat/stream instead of /chat/")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--asr-model", default="tiny")
+    ap.add_argument("--asr-workers", default="1")
+    ap.add_argument("--asr-cache", action="store_true",
+                    help="keep the transcript cache on (every request sends the same audio, so ASR is skipped)")
+    ap.add_argument("--audio", default=os.path.join(HERE, "test.wav"))
+    args = ap.parse_args()
+
+    llm = start_fake_llm(args.llm_latency, args.token_delay)
+    app = start_app(args.port, llm.server_address[1],
+                    {"ASR_MODEL": args.asr_model, "ASR_WORKERS": args.asr_workers,
+                     "ASR_CACHE_MAX": "2048" if args.asr_cache else "0"})
+    base = f"http://127.0.0.1:{args.port}"
+    try:
+        with open(args.audio, "rb") as f:
+            audio = f.read()
+        print(f"{'conc':>5} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'1st byte p50':>13}")
+        for c in args.levels:
+            r = asyncio.run(run_level(base, audio, c, args.requests, args.stream))
+            print(f"{r['concurrency']:>5} {r['req_s']:>8.2f} {r['p50_ms']:>9.0f} {r['p95_ms']:>9.0f} "
+                  f"{r['first_byte_p50_ms']:>13.0f}")
+        print("\n/metrics:")
+        print(json.dumps(httpx.get(f"{base}/metrics").json(), indent=2))
+    finally:
+        app.terminate()
+        app.wait()
+        llm.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,65 @@
 from fastapi import FastAPI, UploadFile, File, Query, Response
-from fastapi.responses import FileResponse, JSONResponse
-from starlette.background import BackgroundTask
-from collections import deque, defaultdict
-from openai import OpenAI
-import whisper, torch, pyttsx3
-import tempfile, os, sys, uuid
+from fastapi.responses import JSONResponse, StreamingResponse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from openai import AsyncOpenAI
+import whisper, torch, httpx
+from conversation_store import MESSAGE_OVERHEAD_TOKENS, make_store, trim_to_budget
+from asr_cache import TranscriptCache
+from asr_batcher import WhisperBatcher
+from tts_pool import TTSPool
+import numpy as np
+import asyncio, queue, threading, time
+import io, re, struct, subprocess, wave, os, sys, uuid
+
+try:
+    import soundfile as sf                # fast in-process WAV/FLAC decode
+except ImportError:
+    sf = None
 
 # =========================
 # Config
 # =========================
-ASR_MODEL = "small"                       # use "tiny" for faster CPU testing
+ASR_MODEL = os.getenv("ASR_MODEL", "small")   # use "tiny" for faster CPU testing
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 IS_WINDOWS = (os.name == "nt")
-HISTORY_MAX_MESSAGES = 10                 # ~5 user/assistant pairs kept in memory
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))   # prior context sent to the LLM
+
+# Conversation store: "memory" (per-process LRU+TTL) or "sqlite" (WAL, shared by all uvicorn workers)
+CONVO_BACKEND = os.getenv("CONVO_BACKEND", "memory")
+CONVO_DB_PATH = os.getenv("CONVO_DB_PATH", "conversations.db")
+# Storage safety bound per conversation. The default is the most messages the token
+# budget could ever admit (each costs at least the per-message overhead), so the
+# store never truncates history the budget would have sent.
+CONVO_MAX_MESSAGES = int(os.getenv("CONVO_MAX_MESSAGES", str(HISTORY_TOKEN_BUDGET // MESSAGE_OVERHEAD_TOKENS)))
+CONVO_MAX = int(os.getenv("CONVO_MAX", "10000"))          # memory backend: LRU capacity
+CONVO_TTL_S = float(os.getenv("CONVO_TTL_S", "86400"))    # idle conversations expire after this
+
+# Transcript cache keyed by sha256(audio bytes + model); ASR_CACHE_PATH="" keeps it in memory only
+ASR_CACHE_MAX = int(os.getenv("ASR_CACHE_MAX", "2048"))
+ASR_CACHE_PATH = os.getenv("ASR_CACHE_PATH", "")
+ASR_WARMUP = os.getenv("ASR_WARMUP", "1") == "1"         # dummy decode per replica before serving
+
+# Micro-batching: concurrent utterances wait up to ASR_BATCH_WAIT_MS to share one Whisper pass.
+# ASR_BATCH_MAX=1 turns it off (one transcribe() per request, as before).
+ASR_BATCH_MAX = int(os.getenv("ASR_BATCH_MAX", "8"))
+ASR_BATCH_WAIT_MS = float(os.getenv("ASR_BATCH_WAIT_MS", "10"))
+
+# Concurrency limits (each stage runs off the event loop)
+ASR_WORKERS = int(os.getenv("ASR_WORKERS", "1"))          # Whisper replicas; one decode per replica at a time
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "2"))          # synthesizer processes, one pyttsx3 engine each
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")         # ensure your account has access to this model
+
+SAMPLE_RATE = whisper.audio.SAMPLE_RATE   # 16 kHz mono float32 is what Whisper consumes
+STREAM_CHUNK_BYTES = 64 * 1024
+MIN_SENTENCE_CHARS = 20                   # don't synthesize tiny fragments like "Dr." on their own
+# pyttsx3 can only render to a path; use RAM-backed scratch space when the OS has it
+TTS_SCRATCH_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+TTS_RATE = 165
+TTS_CACHE_BYTES = int(os.getenv("TTS_CACHE_BYTES", str(64 * 1024 * 1024)))   # rendered phrase WAVs kept in RAM
+TTS_CACHE_MAX_CHARS = 200                 # only short phrases are worth caching
 
 SYSTEM_PROMPT = (
     "You are a concise, helpful voice assistant. "
@@ -22,60 +69,300 @@ SYSTEM_PROMPT = (
 # =========================
 # Init
 # =========================
-app = FastAPI()
+warmup = {"ms": None, "replicas": 0}
+
+def warm_up_asr():
+    """Run one second of silence through every replica: first-call allocations, kernels, caches."""
+    silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    t0 = time.perf_counter()
+    replicas = [asr_models.get() for _ in range(ASR_WORKERS)]
+    try:
+        for model in replicas:
+            model.transcribe(silence, fp16=False)
+    finally:
+        for model in replicas:
+            asr_models.put(model)
+    warmup.update(ms=round((time.perf_counter() - t0) * 1000, 1), replicas=len(replicas))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    loop = asyncio.get_running_loop()
+    startup = [loop.run_in_executor(tts_executor, tts.start)]
+    if ASR_WARMUP:
+        startup.append(loop.run_in_executor(asr_executor, warm_up_asr))
+    await asyncio.gather(*startup)
+    yield
+    tts.close()
+
+app = FastAPI(lifespan=lifespan)
+
+# Whisper's decoder installs KV-cache hooks on the model per call, so a model
+# must not decode two requests at once: keep a pool of replicas instead.
 asr = whisper.load_model(ASR_MODEL, device=DEVICE)
+asr_models: "queue.Queue[whisper.Whisper]" = queue.Queue()
+asr_models.put(asr)
+for _ in range(ASR_WORKERS - 1):
+    asr_models.put(whisper.load_model(ASR_MODEL, device=DEVICE))
+
+# With batching the executor threads only decode uploads and wait on the batcher,
+# so allow enough of them to fill every replica's batch.
+asr_executor = ThreadPoolExecutor(max_workers=ASR_WORKERS * ASR_BATCH_MAX, thread_name_prefix="asr")
+asr_batcher = (WhisperBatcher(asr_models, ASR_WORKERS, ASR_BATCH_MAX, ASR_BATCH_WAIT_MS, fp16=(DEVICE == "cuda"))
+               if ASR_BATCH_MAX > 1 else None)
+asr_cache = TranscriptCache(ASR_MODEL, ASR_CACHE_MAX, ASR_CACHE_PATH or None)
+# Threads only wait on the synthesizer processes (or serve phrase-cache hits)
+tts_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+tts = TTSPool(TTS_WORKERS, TTS_RATE, TTS_SCRATCH_DIR, TTS_CACHE_BYTES, TTS_CACHE_MAX_CHARS)
+
+# Async client over a pooled keep-alive HTTP connection set (OPENAI_BASE_URL is honoured)
+client = AsyncOpenAI(http_client=httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=LLM_MAX_CONCURRENCY, max_keepalive_connections=LLM_MAX_CONCURRENCY),
+    timeout=httpx.Timeout(60.0, connect=5.0),
+))
+llm_slots = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
 
-# In-memory only (resets on restart): conversation_id -> deque of messages
+# conversation_id -> bounded message history (see conversation_store.py)
 # Each message: {"role": "user"|"assistant"|"system", "content": "..."}
-conversations = defaultdict(lambda: deque(maxlen=HISTORY_MAX_MESSAGES))
+conversations = make_store(CONVO_BACKEND, path=CONVO_DB_PATH, max_conversations=CONVO_MAX,
+                           ttl_s=CONVO_TTL_S, max_messages=CONVO_MAX_MESSAGES)
 CURRENT_CONVO_ID: str | None = None  # single default conversation per run (if caller doesn't pass one)
 
+# =========================
+# Stage metrics
+# =========================
+class StageStats:
+    """Queue depth, in-flight count and latency samples for one pipeline stage."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.waiting = 0
+        self.running = 0
+        self.done = 0
+        self.errors = 0
+        self.wait_ms = deque(maxlen=1000)
+        self.service_ms = deque(maxlen=1000)
+        self.lock = threading.Lock()
+
+    async def run_in(self, executor: ThreadPoolExecutor, fn, *args):
+        """Run fn(*args) on `executor`, recording queue wait and service time."""
+        queued_at = time.perf_counter()
+        with self.lock:
+            self.waiting += 1
+
+        def call():
+            started = time.perf_counter()
+            with self.lock:
+                self.waiting -= 1
+                self.running += 1
+                self.wait_ms.append((started - queued_at) * 1000)
+            try:
+                return fn(*args)
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    self.service_ms.append((time.perf_counter() - started) * 1000)
+
+        try:
+            out = await asyncio.get_running_loop().run_in_executor(executor, call)
+        except Exception:
+            with self.lock:
+                self.errors += 1
+            raise
+        with self.lock:
+            self.done += 1
+        return out
+
+    @asynccontextmanager
+    async def slot(self, sem: asyncio.Semaphore):
+        """Async counterpart of run_in for coroutine stages bounded by a semaphore."""
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        async with sem:
+            started = time.perf_counter()
+            self.waiting -= 1
+            self.running += 1
+            self.wait_ms.append((started - queued_at) * 1000)
+            try:
+                yield
+            except Exception:
+                self.errors += 1
+                raise
+            else:
+                self.done += 1
+            finally:
+                self.running -= 1
+                self.service_ms.append((time.perf_counter() - started) * 1000)
+
+    def observe(self, ms: float):
+        """Record a latency sample for a measurement that isn't an executor stage."""
+        with self.lock:
+            self.done += 1
+            self.service_ms.append(ms)
+
+    def snapshot(self) -> dict:
+        def pct(samples, q):
+            if not samples:
+                return None
+            xs = sorted(samples)
+            return round(xs[min(len(xs) - 1, int(q * len(xs)))], 1)
+        with self.lock:
+            return {
+                "limit": self.limit,
+                "queue_depth": self.waiting,
+                "in_flight": self.running,
+                "done": self.done,
+                "errors": self.errors,
+                "wait_ms_p50": pct(self.wait_ms, 0.50),
+                "service_ms_p50": pct(self.service_ms, 0.50),
+                "service_ms_p95": pct(self.service_ms, 0.95),
+                "service_ms_p99": pct(self.service_ms, 0.99),
+            }
+
+stages = {
+    "asr": StageStats("asr", ASR_WORKERS * ASR_BATCH_MAX),
+    "llm": StageStats("llm", LLM_MAX_CONCURRENCY),
+    "tts": StageStats("tts", TTS_WORKERS),
+    "stream_first_audio": StageStats("stream_first_audio", 0),   # request start → first audio byte
+}
+
 # =========================
 # Helpers
 # =========================
+def decode_audio(audio_bytes: bytes) -> np.ndarray:
+    """Decode an upload to a 16 kHz mono float32 buffer without touching disk."""
+    if sf is not None:
+        try:
+            data, sr = sf.read(io.BytesIO(audio_bytes), dtype="float32", always_2d=True)
+            if sr == SAMPLE_RATE:
+                return data.mean(axis=1)
+        except Exception:
+            pass  # not a soundfile format (mp3, m4a, webm...) → ffmpeg
+    out = subprocess.run(
+        ["ffmpeg", "-nostdin", "-threads", "0", "-i", "pipe:0",
+         "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "pipe:1"],
+        input=audio_bytes, capture_output=True, check=True,
+    ).stdout
+    return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+
 def transcribe_audio(audio_bytes: bytes, filename_hint: str) -> str:
-    """Write bytes to temp file, let Whisper transcribe, cleanup temp."""
-    _, ext = os.path.splitext(filename_hint or "")
-    suffix = ext if ext else ".wav"
-    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
-        tmp.write(audio_bytes)
-        tmp_path = tmp.name
-    try:
-        out = asr.transcribe(tmp_path, fp16=False)
-        return (out.get("text") or "").strip()
-    finally:
+    """Decode bytes in memory, then transcribe on a free replica (via the micro-batcher if enabled)."""
+    key = asr_cache.key(audio_bytes)
+    text = asr_cache.get(key)
+    if text is not None:
+        return text
+    audio = decode_audio(audio_bytes)
+    if asr_batcher is not None:
+        text = asr_batcher.transcribe(audio)
+    else:
+        model = asr_models.get()
         try:
-            os.remove(tmp_path)
-        except OSError:
-            pass
+            out = model.transcribe(audio, fp16=False)
+        finally:
+            asr_models.put(model)
+        text = (out.get("text") or "").strip()
+    asr_cache.put(key, text)
+    return text
 
-def generate_response_with_history(messages: list[dict]) -> str:
+async def generate_response_with_history(messages: list[dict]) -> str:
     """Call OpenAI Chat Completions with full message history."""
-    resp = client.chat.completions.create(
-        model="gpt-4o-mini",   # ensure your account has access to this model
-        messages=messages,
-        temperature=0.6,
-    )
+    async with stages["llm"].slot(llm_slots):
+        resp = await client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages,
+            temperature=0.6,
+        )
     return resp.choices[0].message.content.strip()
 
-def synthesize_speech(text: str) -> str:
-    """pyttsx3 → write to temp .wav and return its path."""
-    eng = pyttsx3.init()
-    eng.setProperty("rate", 165)
-    fd, path = tempfile.mkstemp(suffix=".wav")
-    os.close(fd)
-    eng.save_to_file(text, path)
-    eng.runAndWait()
-    return path
-
-def play_local(path: str):
-    """Play WAV on local Windows machine (non-blocking)."""
+def synthesize_speech(text: str) -> bytes:
+    """Text → WAV bytes from a pooled pyttsx3 worker (or the phrase cache)."""
+    return tts.synthesize(text)
+
+def play_local(wav: bytes):
+    """Play WAV bytes on local Windows machine (non-blocking)."""
     if IS_WINDOWS:
-        try:
-            import winsound
-            winsound.PlaySound(path, winsound.SND_FILENAME | winsound.SND_ASYNC)
-        except Exception as e:
-            print(f"[winsound] playback failed: {e}", file=sys.stderr)
+        def play():
+            try:
+                import winsound
+                # SND_MEMORY can't be combined with SND_ASYNC, so block a helper thread instead
+                winsound.PlaySound(wav, winsound.SND_MEMORY)
+            except Exception as e:
+                print(f"[winsound] playback failed: {e}", file=sys.stderr)
+        threading.Thread(target=play, daemon=True).start()
+
+def iter_bytes(data: bytes, size: int = STREAM_CHUNK_BYTES):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+# =========================
+# Streaming helpers
+# =========================
+_SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+")
+
+def pop_sentences(buf: str) -> tuple[list[str], str]:
+    """Split complete sentences (terminator + whitespace) off the front of `buf`."""
+    sentences, start = [], 0
+    for m in _SENTENCE_END.finditer(buf):
+        if m.end() - start >= MIN_SENTENCE_CHARS:
+            sentences.append(buf[start:m.end()].strip())
+            start = m.end()
+    return sentences, buf[start:]
+
+def wav_pcm(wav: bytes) -> tuple[tuple[int, int, int], bytes]:
+    """(channels, sample width, rate) and raw PCM frames of a WAV blob."""
+    with wave.open(io.BytesIO(wav), "rb") as w:
+        return (w.getnchannels(), w.getsampwidth(), w.getframerate()), w.readframes(w.getnframes())
+
+def wav_stream_header(channels: int, sampwidth: int, rate: int) -> bytes:
+    """RIFF/WAVE header with 'unknown' (max) sizes, for a WAV whose length isn't known yet."""
+    unknown = 0xFFFFFFFF
+    return (b"RIFF" + struct.pack("<I", unknown) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 1, channels, rate,
+                                    rate * channels * sampwidth, channels * sampwidth, sampwidth * 8)
+            + b"data" + struct.pack("<I", unknown))
+
+async def stream_llm_sentences(messages: list[dict]):
+    """Yield sentences of the assistant reply as soon as each is complete."""
+    async with stages["llm"].slot(llm_slots):
+        stream = await client.chat.completions.create(
+            model=LLM_MODEL,
+            messages=messages,
+            temperature=0.6,
+            stream=True,
+        )
+        buf = ""
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            buf += chunk.choices[0].delta.content or ""
+            sentences, buf = pop_sentences(buf)
+            for sent in sentences:
+                yield sent
+        if buf.strip():
+            yield buf.strip()
+
+# =========================
+# API: /metrics
+# =========================
+@app.get("/metrics")
+async def metrics():
+    return {**{name: st.snapshot() for name, st in stages.items()},
+            "asr_cache": asr_cache.stats(),
+            "asr_warmup": warmup,
+            "asr_batching": asr_batcher.stats() if asr_batcher else None,
+            "tts_pool": tts.stats(),
+            "conversations": conversations.stats()}
+
+def resolve_conversation(conversation_id: str | None, reset: bool) -> str:
+    """Default to one auto-generated conversation per run; optionally clear its history."""
+    global CURRENT_CONVO_ID
+    if conversation_id is None:
+        if CURRENT_CONVO_ID is None:
+            CURRENT_CONVO_ID = str(uuid.uuid4())
+        conversation_id = CURRENT_CONVO_ID
+    if reset:
+        conversations.clear(conversation_id)
+    return conversation_id
 
 # =========================
 # API: /chat
@@ -90,74 +377,128 @@ async def chat_endpoint(
     conversation_id: str | None = Query(None, description="Sticky ID for multi-turn memory"),
     reset: bool = Query(False, description="Reset this conversation's history"),
 ):
-    global CURRENT_CONVO_ID
-
     # 0) Use a single auto-generated conversation per run if none provided
-    if conversation_id is None:
-        if CURRENT_CONVO_ID is None:
-            CURRENT_CONVO_ID = str(uuid.uuid4())
-        conversation_id = CURRENT_CONVO_ID
+    conversation_id = resolve_conversation(conversation_id, reset)
 
     # Expose the ID to clients (useful in Swagger/curl)
     response.headers["X-Conversation-Id"] = conversation_id
 
-    # Optional reset of just this conversation
-    if reset:
-        conversations[conversation_id].clear()
-
-    # 1) ASR
+    # 1) ASR (bounded worker pool, off the event loop)
     audio_bytes = await file.read()
-    user_text = transcribe_audio(audio_bytes, file.filename)
+    user_text = await stages["asr"].run_in(asr_executor, transcribe_audio, audio_bytes, file.filename)
 
     # 2) Build messages from prior context + new user message
-    history = conversations[conversation_id]
-    messages = [{"role": "system", "content": SYSTEM_PROMPT}, *list(history), {"role": "user", "content": user_text}]
+    history = trim_to_budget(conversations.get(conversation_id), HISTORY_TOKEN_BUDGET)
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}, *history, {"role": "user", "content": user_text}]
 
-    # 3) LLM
-    bot_text = generate_response_with_history(messages)
+    # 3) LLM (async client, pooled connections)
+    bot_text = await generate_response_with_history(messages)
 
-    # 4) Update in-memory conversation (RAM only; resets on restart)
-    history.append({"role": "user", "content": user_text})
-    history.append({"role": "assistant", "content": bot_text})
+    # 4) Update conversation store
+    conversations.append(conversation_id, [
+        {"role": "user", "content": user_text},
+        {"role": "assistant", "content": bot_text},
+    ])
 
     # --- Debug JSON path (Option A): still allow local speech if requested ---
     if debug:
         if speak_when_debug:
-            audio_path_dbg = synthesize_speech(bot_text)
+            wav_dbg = await stages["tts"].run_in(tts_executor, synthesize_speech, bot_text)
             if play:
-                play_local(audio_path_dbg)
-            # cleanup the temp wav created only for local playback
-            try:
-                os.remove(audio_path_dbg)
-            except OSError:
-                pass
+                play_local(wav_dbg)
 
         return JSONResponse({
             "conversation_id": conversation_id,
-            "history_len": len(history),
+            "history_len": len(conversations.get(conversation_id)),
             "device": DEVICE,
             "asr_model": ASR_MODEL,
             "text": user_text,
             "reply": bot_text
         })
 
-    # 5) TTS → WAV file (normal non-debug response)
-    audio_path = synthesize_speech(bot_text)
+    # 5) TTS → WAV bytes (normal non-debug response)
+    wav = await stages["tts"].run_in(tts_executor, synthesize_speech, bot_text)
 
     # Optional local playback
     if play:
-        play_local(audio_path)
+        play_local(wav)
+
+    # 6) Stream WAV from memory (chunked; nothing to clean up afterwards)
+    return StreamingResponse(
+        iter_bytes(wav),
+        media_type="audio/wav",
+        headers={
+            "Content-Disposition": 'attachment; filename="reply.wav"',
+            "X-Conversation-Id": conversation_id,
+        },
+    )
+
 
-    # 6) Return WAV and clean up after sending
-    def cleanup(p: str):
+# =========================
+# API: /chat/stream
+# =========================
+@app.post("/chat/stream")
+async def chat_stream_endpoint(
+    file: UploadFile = File(...),
+    conversation_id: str | None = Query(None, description="Sticky ID for multi-turn memory"),
+    reset: bool = Query(False, description="Reset this conversation's history"),
+):
+    """
+    Same turn as /chat/, but the reply is a chunked WAV stream: the LLM response is
+    consumed as a token stream, cut at sentence boundaries, and each sentence is
+    synthesized and sent as soon as it is complete (time-to-first-audio ≈ first sentence).
+    """
+    t_start = time.perf_counter()
+    conversation_id = resolve_conversation(conversation_id, reset)
+
+    # 1) ASR
+    audio_bytes = await file.read()
+    user_text = await stages["asr"].run_in(asr_executor, transcribe_audio, audio_bytes, file.filename)
+
+    # 2) Messages
+    history = trim_to_budget(conversations.get(conversation_id), HISTORY_TOKEN_BUDGET)
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}, *history, {"role": "user", "content": user_text}]
+
+    # 3) LLM sentences → TTS futures, in order; TTS of sentence i overlaps LLM streaming of i+1
+    pending: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        reply = []
         try:
-            os.remove(p)
-        except OSError:
-            pass
+            async for sent in stream_llm_sentences(messages):
+                reply.append(sent)
+                pending.put_nowait(asyncio.ensure_future(
+                    stages["tts"].run_in(tts_executor, synthesize_speech, sent)))
+        finally:
+            pending.put_nowait(None)
+        conversations.append(conversation_id, [
+            {"role": "user", "content": user_text},
+            {"role": "assistant", "content": " ".join(reply)},
+        ])
+
+    producer = asyncio.create_task(produce())
 
-    return FileResponse(
-        audio_path,
+    # 4) One WAV header, then PCM frames of each sentence as they are synthesized
+    async def audio_frames():
+        header_sent = False
+        try:
+            while (fut := await pending.get()) is not None:
+                params, pcm = wav_pcm(await fut)
+                if not header_sent:
+                    yield wav_stream_header(*params)
+                    header_sent = True
+                    stages["stream_first_audio"].observe((time.perf_counter() - t_start) * 1000)
+                for chunk in iter_bytes(pcm):
+                    yield chunk
+            await producer
+        finally:
+            producer.cancel()
+
+    return StreamingResponse(
+        audio_frames(),
         media_type="audio/wav",
-        filename="reply.wav",
-        background=BackgroundTask(cleanup, audio_path),
-    )
\ No newline at end of file
+        headers={
+            "Content-Disposition": 'attachment; filename="reply.wav"',
+            "X-Conversation-Id": conversation_id,
+        },
+    )
@@ -0,0 +1,128 @@
+"""
+Pooled pyttsx3 synthesis.
+
+pyttsx3.init() is slow and an engine is not thread-safe, so each worker process
+initialises one engine at startup and reuses it for every request; the
+executor's call queue is the request queue and N workers synthesize in parallel.
+Rendered WAVs for short, frequent phrases ("Sure.", "One moment.") are kept in
+a byte-bounded LRU in the parent so repeats never reach a worker.
+"""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+import os, re, tempfile, threading, time
+
+# =========================
+# Worker process
+# =========================
+_engine = None
+_init_error: str | None = None
+_scratch_dir: str | None = None
+
+def _init_worker(rate: int, scratch_dir: str | None):
+    global _engine, _init_error, _scratch_dir
+    _scratch_dir = scratch_dir
+    try:
+        import pyttsx3
+        _engine = pyttsx3.init()
+        _engine.setProperty("rate", rate)
+    except Exception as e:   # keep the pool alive; every call reports the failure instead
+        _init_error = f"{type(e).__name__}: {e}"
+
+def _ping() -> int:
+    return os.getpid()
+
+def _render(text: str) -> bytes:
+    """pyttsx3 → WAV bytes (rendered in scratch space, read back, unlinked)."""
+    if _engine is None:
+        raise RuntimeError(f"TTS engine unavailable in worker: {_init_error}")
+    fd, path = tempfile.mkstemp(suffix=".wav", dir=_scratch_dir)
+    os.close(fd)
+    try:
+        _engine.save_to_file(text, path)
+        _engine.runAndWait()
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+# =========================
+# Parent side
+# =========================
+def normalize_phrase(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+class PhraseCache:
+    """LRU of rendered WAVs keyed by normalised text, bounded by total bytes."""
+
+    def __init__(self, max_bytes: int, max_chars: int):
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars   # long replies are unlikely to repeat; don't let them evict phrases
+        self.data: "OrderedDict[str, bytes]" = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, phrase: str) -> bytes | None:
+        with self.lock:
+            wav = self.data.get(phrase)
+            if wav is None:
+                self.misses += 1
+                return None
+            self.data.move_to_end(phrase)
+            self.hits += 1
+            return wav
+
+    def put(self, phrase: str, wav: bytes):
+        if len(phrase) > self.max_chars or len(wav) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.data.pop(phrase, None)
+            if old is not None:
+                self.size -= len(old)
+            self.data[phrase] = wav
+            self.size += len(wav)
+            while self.size > self.max_bytes:
+                _, evicted = self.data.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {"entries": len(self.data), "bytes": self.size, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses,
+                    "hit_rate": round(self.hits / total, 3) if total else None}
+
+class TTSPool:
+    def __init__(self, workers: int, rate: int, scratch_dir: str | None,
+                 cache_bytes: int, cache_max_chars: int):
+        self.workers = workers
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                                        initializer=_init_worker, initargs=(rate, scratch_dir))
+        self.cache = PhraseCache(cache_bytes, cache_max_chars)
+        self.startup_ms: float | None = None
+
+    def start(self):
+        """Spawn every worker and initialise its engine now, not on the first request."""
+        t0 = time.perf_counter()
+        pids = {f.result() for f in [self.pool.submit(_ping) for _ in range(self.workers * 2)]}
+        self.startup_ms = round((time.perf_counter() - t0) * 1000, 1)
+        return pids
+
+    def synthesize(self, text: str) -> bytes:
+        phrase = normalize_phrase(text)
+        wav = self.cache.get(phrase)
+        if wav is None:
+            wav = self.pool.submit(_render, phrase).result()
+            self.cache.put(phrase, wav)
+        return wav
+
+    def close(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "startup_ms": self.startup_ms, "cache": self.cache.stats()}
@@ -2,9 +2,12 @@
 # Query arXiv API for cs.AI papers and download PDFs into data/arxiv
 
 import re
+import threading
 import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from urllib.parse import urljoin
+from urllib.parse import urljoin, urlparse
 
 import requests
 from bs4 import BeautifulSoup
@@ -15,7 +18,10 @@ from requests.adapters import HTTPAdapter
 CATEGORY    = "cs.AI"     # <-- AI subcategory (change to "cs.CL" etc. if needed)
 MAX_PAPERS  = 50          # how many PDFs to download total
 PER_PAGE    = 100         # API page size (<= 200 is safe)
-SLEEP_S     = 0.5         # politeness delay between downloads
+RATE_PER_S  = 2.0         # politeness: global download starts per second (token bucket)
+BURST       = 4           # token bucket capacity
+MAX_WORKERS = 8           # concurrent downloads overall
+PER_HOST    = 4           # concurrent downloads per host
 TIMEOUT     = 60
 BASE        = "https://arxiv.org"
 
@@ -27,7 +33,7 @@ OUT_DIR.mkdir(parents=True, exist_ok=True)
 HEADERS = {"User-Agent": "arxiv-api-downloader (+https://github.com/your-handle)"}
 
 # -------------------- HTTP session w/ retries --------------------
-def make_session() -> requests.Session:
+def make_session(pool_size: int = 10) -> requests.Session:
     sess = requests.Session()
     retries = Retry(
         total=5,
@@ -36,7 +42,7 @@ def make_session() -> requests.Session:
         allowed_methods=frozenset(["GET", "HEAD"]),
         raise_on_status=False,
     )
-    adapter = HTTPAdapter(max_retries=retries, pool_connections=10, pool_maxsize=10)
+    adapter = HTTPAdapter(max_retries=retries, pool_connections=pool_size, pool_maxsize=pool_size)
     sess.mount("http://", adapter)
     sess.mount("https://", adapter)
     sess.headers.update(HEADERS)
@@ -75,27 +81,140 @@ def parse_api_feed(xml_text: str) -> list[dict]:
         items.append({"id": arxiv_id, "title": title, "pdf_url": pdf_url})
     return items
 
-def download_pdf(sess: requests.Session, item: dict, out_dir: Path) -> Path:
-    filename = f"{item['id']} - {sanitize(item['title']) or item['id']}.pdf"
-    out_path = out_dir / filename
+# -------------------- Concurrency helpers --------------------
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens/s refilled up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class HostLimiter:
+    """At most `limit` in-flight requests per host."""
+
+    def __init__(self, limit: int):
+        self.lock = threading.Lock()
+        self.sems = defaultdict(lambda: threading.BoundedSemaphore(limit))
+
+    def __call__(self, url: str) -> threading.BoundedSemaphore:
+        with self.lock:
+            return self.sems[urlparse(url).netloc]
+
+class DownloadStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bytes = 0
+        self.done = 0
+        self.skipped = 0
+        self.failed = 0
+        self.t0 = time.monotonic()
+
+    def add(self, **kw):
+        with self.lock:
+            for k, v in kw.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def report(self) -> str:
+        elapsed = max(time.monotonic() - self.t0, 1e-9)
+        mb = self.bytes / 1e6
+        return (
+            f"{self.done} downloaded, {self.skipped} skipped, {self.failed} failed | "
+            f"{mb:.1f} MB in {elapsed:.1f}s → {mb / elapsed:.2f} MB/s, "
+            f"{self.done / elapsed * 60:.1f} papers/min"
+        )
+
+# -------------------- Download --------------------
+def pdf_filename(item: dict) -> str:
+    return f"{item['id']} - {sanitize(item['title']) or item['id']}.pdf"
+
+def download_pdf(sess: requests.Session, item: dict, out_dir: Path, stats: DownloadStats | None = None) -> Path:
+    """
+    Download into `<name>.part`, resuming with an HTTP Range request if a partial
+    file is left over from an interrupted run, then rename into place.
+    """
+    out_path = out_dir / pdf_filename(item)
+    part_path = out_path.with_name(out_path.name + ".part")
 
     if out_path.exists() and out_path.stat().st_size > 0:
         print(f"✓ Exists, skipping: {out_path.name}")
+        if stats:
+            stats.add(skipped=1)
         return out_path
 
-    with sess.get(item["pdf_url"], stream=True, timeout=TIMEOUT) as r:
-        r.raise_for_status()
-        with open(out_path, "wb") as f:
-            for chunk in r.iter_content(chunk_size=64 * 1024):
-                if chunk:
-                    f.write(chunk)
-
-    print(f"⬇️  Downloaded: {out_path.name}")
+    have = part_path.stat().st_size if part_path.exists() else 0
+    headers = {"Range": f"bytes={have}-"} if have else {}
+    written = 0
+
+    with sess.get(item["pdf_url"], stream=True, timeout=TIMEOUT, headers=headers) as r:
+        if r.status_code == 416 and have:
+            # Partial file already holds the whole body
+            pass
+        else:
+            r.raise_for_status()
+            mode = "ab" if have and r.status_code == 206 else "wb"  # 200 → server ignored Range
+            with open(part_path, mode) as f:
+                for chunk in r.iter_content(chunk_size=64 * 1024):
+                    if chunk:
+                        f.write(chunk)
+                        written += len(chunk)
+
+    part_path.replace(out_path)
+    if stats:
+        stats.add(bytes=written, done=1)
+    resumed = f" (resumed at {have} B)" if have else ""
+    print(f"⬇️  Downloaded: {out_path.name}{resumed}")
     return out_path
 
+def download_all(
+    sess: requests.Session,
+    items: list[dict],
+    out_dir: Path,
+    max_workers: int = MAX_WORKERS,
+    rate_per_s: float = RATE_PER_S,
+    burst: int = BURST,
+    per_host: int = PER_HOST,
+) -> DownloadStats:
+    """Download `items` concurrently under a global rate limit and per-host caps."""
+    bucket = TokenBucket(rate_per_s, burst)
+    host_sem = HostLimiter(per_host)
+    stats = DownloadStats()
+
+    def job(it: dict) -> Path:
+        bucket.acquire()
+        with host_sem(it["pdf_url"]):
+            return download_pdf(sess, it, out_dir, stats)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(job, it): it for it in items}
+        for i, fut in enumerate(as_completed(futures), 1):
+            it = futures[fut]
+            try:
+                fut.result()
+            except Exception as e:
+                stats.add(failed=1)
+                print(f"   ✗ Failed {it['id']}: {e}")
+            if i % 10 == 0 or i == len(items):
+                print(f"[{i:03d}/{len(items)}] {stats.report()}")
+    return stats
+
 # -------------------- Main --------------------
 def main():
-    sess = make_session()
+    sess = make_session(pool_size=MAX_WORKERS)
 
     # Page through API until we have MAX_PAPERS (or run out)
     items, seen = [], set()
@@ -120,15 +239,10 @@ def main():
         return
 
     print(f"Will download {len(items)} PDFs into: {OUT_DIR.resolve()}")
-    for i, it in enumerate(items, 1):
-        print(f"[{i:03d}/{len(items)}] {it['id']} — {it['title'][:80]}")
-        try:
-            download_pdf(sess, it, OUT_DIR)
-        except Exception as e:
-            print(f"   ✗ Failed: {e}")
-        time.sleep(SLEEP_S)
+    stats = download_all(sess, items, OUT_DIR)
 
     print(f"\n✅ Done. PDFs saved to: {OUT_DIR.resolve()}")
+    print(f"   {stats.report()}")
 
 if __name__ == "__main__":
     main()
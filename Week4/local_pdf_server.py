@@ -0,0 +1,93 @@
+# local_pdf_server.py
+# Local HTTP stand-in for arxiv.org: serves fake PDFs (with Range support) so the
+# concurrent downloader in arXiv_scraper.py can be exercised offline.
+#
+#   python local_pdf_server.py              # 40 fake papers, 20 ms latency
+#   python local_pdf_server.py --papers 200 --size-kb 800
+
+import argparse
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import arXiv_scraper as scraper
+
+# -------------------- Stand-in server --------------------
+def make_handler(blobs: dict[str, bytes], latency_s: float):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency_s)
+            body = blobs.get(self.path.rsplit("/", 1)[-1])
+            if body is None:
+                self.send_error(404)
+                return
+
+            m = re.match(r"bytes=(\d+)-", self.headers.get("Range", ""))
+            start = int(m.group(1)) if m else 0
+            if start >= len(body):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.end_headers()
+                return
+
+            self.send_response(206 if m else 200)
+            if m:
+                self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(body) - start))
+            self.end_headers()
+            self.wfile.write(body[start:])
+
+    return Handler
+
+def serve(blobs: dict[str, bytes], latency_s: float) -> ThreadingHTTPServer:
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(blobs, latency_s))
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+# -------------------- Main --------------------
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--papers", type=int, default=40)
+    ap.add_argument("--size-kb", type=int, default=300)
+    ap.add_argument("--latency", type=float, default=0.02)
+    ap.add_argument("--rate", type=float, default=50.0)
+    args = ap.parse_args()
+
+    blobs = {f"9999.{i:05d}v1": os.urandom(args.size_kb * 1024) for i in range(args.papers)}
+    srv = serve(blobs, args.latency)
+    base = f"http://127.0.0.1:{srv.server_address[1]}/pdf"
+    items = [{"id": k, "title": f"Paper {k}", "pdf_url": f"{base}/{k}"} for k in blobs]
+
+    out_dir = Path(tempfile.mkdtemp(prefix="arxiv_stand_in_"))
+    try:
+        # Leave a few half-written .part files behind to exercise Range resume
+        for it in items[:3]:
+            part = out_dir / (scraper.pdf_filename(it) + ".part")
+            part.write_bytes(blobs[it["id"]][: len(blobs[it["id"]]) // 2])
+
+        sess = scraper.make_session(pool_size=scraper.MAX_WORKERS)
+        stats = scraper.download_all(sess, items, out_dir, rate_per_s=args.rate, burst=scraper.MAX_WORKERS)
+
+        bad = [
+            it["id"] for it in items
+            if hashlib.sha256((out_dir / scraper.pdf_filename(it)).read_bytes()).digest()
+            != hashlib.sha256(blobs[it["id"]]).digest()
+        ]
+        print(f"\n{stats.report()}")
+        print("✅ All files match." if not bad else f"✗ Mismatched: {bad}")
+    finally:
+        srv.shutdown()
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
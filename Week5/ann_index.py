@@ -0,0 +1,232 @@
+"""
+Vector index builders for the RAG notebook.
+
+All indexes use inner product on normalized embeddings (== cosine), like the
+original IndexFlatIP, so scores stay comparable across index types.
+
+- flat:     exact brute force, no training. Fine up to ~100k chunks.
+- ivf_flat: k-means coarse quantizer, scans `nprobe` of `nlist` lists per query.
+- ivf_pq:   IVF + product-quantized codes (m bytes/vector): millions of chunks in RAM.
+- hnsw:     graph index, no training, `ef_search` trades recall for latency.
+- sq8:      int8 scalar quantization (1 byte/dim, 4x smaller than float32).
+- binary:   sign bit per dimension (dim/8 bytes, 32x smaller), Hamming search.
+
+The compact kinds (sq8, binary) are meant to be searched through Rescorer:
+the first stage fetches k*rescore candidates from the compact codes, and exact
+inner products against the float embeddings (a memmap is fine; only the
+candidate rows are read) pick the final top k.
+"""
+import numpy as np
+import faiss
+
+INDEX_KINDS = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "binary")
+COMPACT_KINDS = ("sq8", "binary")
+DEFAULT_RESCORE = {"sq8": 4, "binary": 20}   # candidates fetched per result before float rescoring
+MIN_POINTS_PER_LIST = 39          # faiss warns below this many training points per centroid
+TRAIN_SAMPLE = 64                 # training points per centroid (faiss wants 39..256)
+
+def default_nlist(n: int) -> int:
+    """~4*sqrt(n) lists, capped so each centroid still gets enough training points."""
+    return max(1, min(int(4 * np.sqrt(n)), n // MIN_POINTS_PER_LIST))
+
+def default_pq_m(dim: int) -> int:
+    """Largest sub-quantizer count <= dim/8 that divides dim (384 → 48 bytes per vector)."""
+    for m in range(max(1, dim // 8), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+def _train_sample(embs: np.ndarray, n: int, seed: int = 0) -> np.ndarray:
+    if len(embs) <= n:
+        return embs
+    rng = np.random.default_rng(seed)
+    return embs[np.sort(rng.choice(len(embs), n, replace=False))]
+
+def new_index(dim: int, kind: str = "flat", train: np.ndarray | None = None, nlist: int | None = None,
+              pq_m: int | None = None, pq_nbits: int = 8, hnsw_m: int = 32,
+              ef_construction: int = 200, nprobe: int = 16, ef_search: int = 64) -> faiss.Index:
+    """Empty index of `kind`, trained on `train` when the kind needs it (IVF)."""
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown index kind {kind!r}; use one of {INDEX_KINDS}")
+    n = 0 if train is None else len(train)
+
+    if kind == "ivf_pq" and n < MIN_POINTS_PER_LIST * 2 ** pq_nbits:
+        print(f"[ann] {n} vectors is too few to train PQ codebooks; using ivf_flat")
+        kind = "ivf_flat"
+    if kind == "ivf_flat" and n == 0:
+        raise ValueError("IVF indexes need training vectors")
+
+    if kind == "flat":
+        index = faiss.IndexFlatIP(dim)
+    elif kind == "binary":
+        return BinaryIndex(dim)
+    elif kind == "sq8":
+        if n == 0:
+            raise ValueError("sq8 indexes need training vectors (per-dimension value ranges)")
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+        index.train(_train_sample(np.ascontiguousarray(train, dtype="float32"), 100_000))
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = ef_construction
+    else:
+        nlist = nlist or default_nlist(n)
+        quantizer = faiss.IndexFlatIP(dim)
+        if kind == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m or default_pq_m(dim), pq_nbits,
+                                     faiss.METRIC_INNER_PRODUCT)
+        centroids = nlist if kind == "ivf_flat" else max(nlist, 2 ** pq_nbits)
+        index.train(_train_sample(np.ascontiguousarray(train, dtype="float32"), centroids * TRAIN_SAMPLE))
+
+    set_search_params(index, nprobe=nprobe, ef_search=ef_search)
+    return index
+
+def build_index(embs: np.ndarray, kind: str = "flat", **params) -> faiss.Index:
+    """Build (train + add) an index of `kind` over normalized float32 embeddings."""
+    embs = np.ascontiguousarray(embs, dtype="float32")
+    index = new_index(embs.shape[1], kind, train=embs, **params)
+    index.add(embs)
+    return index
+
+def set_search_params(index: faiss.Index, nprobe: int | None = None, ef_search: int | None = None,
+                      rescore: int | None = None):
+    """Apply query-time knobs; parameters that don't apply to this index type are ignored."""
+    if isinstance(index, Rescorer):
+        if rescore is not None:
+            index.factor = rescore
+        index = index.index
+    if isinstance(index, BinaryIndex):
+        return
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    hnsw = _find_hnsw(index)
+    if hnsw is not None and ef_search:
+        hnsw.hnsw.efSearch = ef_search
+
+def _unwrap(index: faiss.Index) -> faiss.Index:
+    """
+    Concrete index class, looking through IndexIDMap. The result doesn't own its
+    C++ object: callers must keep `index` referenced while they use it.
+    """
+    inner = faiss.downcast_index(index)
+    if isinstance(inner, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        inner = faiss.downcast_index(inner.index)
+    return inner
+
+def _find_hnsw(index: faiss.Index):
+    inner = _unwrap(index)
+    return inner if isinstance(inner, faiss.IndexHNSW) else None
+
+def index_kind(index: faiss.Index) -> str:
+    if isinstance(index, Rescorer):
+        index = index.index
+    if isinstance(index, BinaryIndex):
+        return "binary"
+    inner = _unwrap(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(inner, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(inner, faiss.IndexIVF):
+        return "ivf_flat"
+    if isinstance(inner, faiss.IndexScalarQuantizer):
+        return "sq8"
+    return "flat"
+
+def load_index(path: str, nprobe: int | None = None, ef_search: int | None = None) -> faiss.Index:
+    """read_index does not persist nprobe/efSearch, so re-apply them after loading."""
+    try:
+        index = faiss.read_index(path)
+    except RuntimeError:                 # not a float index: binary codes
+        return BinaryIndex(index=faiss.read_index_binary(path))
+    set_search_params(index, nprobe=nprobe, ef_search=ef_search)
+    return index
+
+def write_index(index, path: str):
+    if isinstance(index, BinaryIndex):
+        faiss.write_index_binary(index.index, path)
+    else:
+        faiss.write_index(index, path)
+
+def index_bytes(index) -> int:
+    if isinstance(index, BinaryIndex):
+        return faiss.serialize_index_binary(index.index).nbytes
+    return faiss.serialize_index(index).nbytes
+
+def with_rescoring(index, embs: np.ndarray, rescore: int | None = None):
+    """Wrap compact indexes in a Rescorer over `embs`; other kinds are returned unchanged."""
+    kind = index_kind(index)
+    if kind not in COMPACT_KINDS:
+        return index
+    return Rescorer(index, embs, DEFAULT_RESCORE[kind] if rescore is None else rescore)
+
+class BinaryIndex:
+    """
+    One sign bit per dimension in a faiss IndexBinaryFlat (with ids), behind the
+    float interface the rest of the code uses: float vectors in, and Hamming
+    distances mapped back to a cosine-like score (1 - 2*hamming/dim) out.
+    """
+
+    def __init__(self, dim: int | None = None, index: faiss.IndexBinary | None = None):
+        self.index = index if index is not None else faiss.IndexBinaryIDMap2(faiss.IndexBinaryFlat(dim))
+        self.d = self.index.d
+
+    @staticmethod
+    def pack(x: np.ndarray) -> np.ndarray:
+        return np.packbits(np.asarray(x) > 0, axis=1)
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    def add(self, x: np.ndarray):
+        self.add_with_ids(x, np.arange(self.ntotal, self.ntotal + len(x), dtype="int64"))
+
+    def add_with_ids(self, x: np.ndarray, ids: np.ndarray):
+        self.index.add_with_ids(self.pack(x), np.asarray(ids, dtype="int64"))
+
+    def remove_ids(self, ids: np.ndarray) -> int:
+        return self.index.remove_ids(np.asarray(ids, dtype="int64"))
+
+    def search(self, Q: np.ndarray, k: int):
+        D, I = self.index.search(self.pack(Q), k)
+        return 1.0 - 2.0 * D.astype("float32") / self.d, I
+
+class Rescorer:
+    """
+    Search a compact index for k*factor candidates, then rank them by exact inner
+    product with their float rows of `embs` (chunk_id == row, as in embs.npy).
+    factor <= 1 returns the compact index's own ranking.
+    """
+
+    def __init__(self, index, embs: np.ndarray, factor: int):
+        self.index = index
+        self.embs = embs
+        self.factor = factor
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal
+
+    def search(self, Q: np.ndarray, k: int):
+        if self.factor <= 1:
+            return self.index.search(Q, k)
+        Q = np.ascontiguousarray(Q, dtype="float32")
+        _, I = self.index.search(Q, k * self.factor)
+        valid = I >= 0
+        rows = np.where(valid, I, 0)
+        cand = np.asarray(self.embs[rows.ravel()], dtype="float32").reshape(*rows.shape, -1)
+        exact = np.einsum("bnd,bd->bn", cand, Q)
+        exact[~valid] = -np.inf
+        order = np.argsort(-exact, axis=1, kind="stable")[:, :k]
+        D = np.take_along_axis(exact, order, axis=1)
+        I = np.take_along_axis(I, order, axis=1)
+        I[~np.isfinite(D)] = -1
+        return D, I
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    """Mean fraction of the exact top-k ids that the approximate search returned."""
+    k = truth.shape[1]
+    return float(np.mean([len(set(f[:k]) & set(t)) / k for f, t in zip(found, truth)]))
@@ -0,0 +1,106 @@
+# bench_ann.py
+# Recall@k vs. single-query latency for each index type, against exact IndexFlatIP.
+# sq8/binary are measured with float rescoring read from a memory-mapped copy of
+# the embeddings (rescore=0: the compact codes' own ranking).
+#
+# Vectors come from artifacts/embs.npy (or are reconstructed from the flat
+# artifacts/arxiv.index); --synthetic N generates N clustered unit vectors instead
+# so the large-corpus regime can be measured without a large corpus.
+#
+#   python bench_ann.py                          # the notebook's own embeddings
+#   python bench_ann.py --synthetic 1000000 --k 10
+#   python bench_ann.py --synthetic 200000 --kinds flat sq8 binary
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import faiss
+
+import ann_index
+
+INDEX_DIR = "artifacts"
+SWEEPS = {
+    "flat":     [{}],
+    "ivf_flat": [{"nprobe": p} for p in (1, 4, 16, 64)],
+    "ivf_pq":   [{"nprobe": p} for p in (4, 16, 64)],
+    "hnsw":     [{"ef_search": e} for e in (16, 32, 64, 128)],
+    "sq8":      [{"rescore": r} for r in (0, 2, 4)],
+    "binary":   [{"rescore": r} for r in (0, 4, 10, 20)],
+}
+
+def load_corpus_vectors() -> np.ndarray:
+    path = os.path.join(INDEX_DIR, "embs.npy")
+    if os.path.exists(path):
+        return np.load(path).astype("float32")
+    index = faiss.read_index(os.path.join(INDEX_DIR, "arxiv.index"))
+    return index.reconstruct_n(0, index.ntotal)
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 1000, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    x = centers[rng.integers(0, clusters, n)] + 0.6 * rng.standard_normal((n, dim), dtype=np.float32)
+    faiss.normalize_L2(x)
+    return x
+
+def make_queries(embs: np.ndarray, n: int, seed: int = 1) -> np.ndarray:
+    """Perturbed corpus vectors: near real neighbourhoods but never an exact match."""
+    rng = np.random.default_rng(seed)
+    q = embs[rng.choice(len(embs), n, replace=False)].copy()
+    q += 0.05 * rng.standard_normal(q.shape, dtype=np.float32)
+    faiss.normalize_L2(q)
+    return q
+
+def time_queries(index, queries, k):
+    faiss.omp_set_num_threads(1)     # per-query latency, as a request handler sees it
+    lat, found = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        _, I = index.search(q[None, :], k)
+        lat.append(time.perf_counter() - t0)
+        found.append(I[0])
+    lat = np.sort(np.array(lat) * 1000)
+    return np.array(found), lat[len(lat) // 2], lat[min(len(lat) - 1, int(0.99 * len(lat)))]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--synthetic", type=int, default=0, help="benchmark N synthetic vectors instead")
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--kinds", nargs="+", default=list(ann_index.INDEX_KINDS))
+    args = ap.parse_args()
+
+    embs = synthetic_vectors(args.synthetic, args.dim) if args.synthetic else load_corpus_vectors()
+    queries = make_queries(embs, min(args.queries, len(embs)))
+    print(f"{len(embs):,} vectors x {embs.shape[1]}d, {len(queries)} queries, recall@{args.k}\n")
+
+    exact = faiss.IndexFlatIP(embs.shape[1])
+    exact.add(embs)
+    _, truth = exact.search(queries, args.k)
+
+    # Rescoring reads float rows from disk-backed memory, as the notebook's embs.npy
+    tmp = tempfile.TemporaryDirectory()
+    np.save(os.path.join(tmp.name, "embs.npy"), embs)
+    embs_mmap = np.load(os.path.join(tmp.name, "embs.npy"), mmap_mode="r")
+
+    print(f"{'index':<10} {'params':<14} {'build s':>8} {'MB':>8} {'recall':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for kind in args.kinds:
+        faiss.omp_set_num_threads(os.cpu_count() or 1)
+        t0 = time.perf_counter()
+        index = ann_index.build_index(embs, kind)
+        build_s = time.perf_counter() - t0
+        size_mb = ann_index.index_bytes(index) / 1e6
+        searcher = ann_index.with_rescoring(index, embs_mmap)
+        for params in SWEEPS[kind]:
+            ann_index.set_search_params(searcher, **params)
+            found, p50, p99 = time_queries(searcher, queries, args.k)
+            label = ", ".join(f"{k}={v}" for k, v in params.items()) or "-"
+            print(f"{ann_index.index_kind(index):<10} {label:<14} {build_s:>8.1f} {size_mb:>8.1f} "
+                  f"{ann_index.recall_at_k(found, truth):>7.3f} {p50:>8.3f} {p99:>8.3f}")
+    tmp.cleanup()
+
+if __name__ == "__main__":
+    main()
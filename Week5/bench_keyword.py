@@ -0,0 +1,121 @@
+# bench_keyword.py
+# FTS5 build time and keyword query latency: the notebook's original code
+# (two cur.execute calls per chunk; a fresh sqlite3.connect per query) vs.
+# keyword_engine (batched executemany + 'optimize'; pooled, tuned read-only connections).
+#
+# The corpus is synthetic: --chunks chunks of ~--words Zipf-distributed words each,
+# so the 100k-chunk regime can be measured without 100k chunks of papers.
+#
+#   python bench_keyword.py                        # 100k chunks
+#   python bench_keyword.py --chunks 20000 --queries 500
+
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+
+import keyword_engine
+from incremental_build import SCHEMA
+
+def synthetic_corpus(n: int, words: int, vocab: int = 50_000, n_docs: int = 500, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    lexicon = np.array([f"w{i}" for i in range(vocab)])
+    ranks = np.minimum(rng.zipf(1.2, size=n * words), vocab) - 1
+    texts = [" ".join(lexicon[ranks[i * words:(i + 1) * words]]) for i in range(n)]
+    sources = [f"paper_{i % n_docs:04d}.pdf" for i in range(n)]
+    return texts, sources, lexicon
+
+def make_queries(lexicon, n: int, seed: int = 1):
+    """1-2 terms from the mid-frequency band (ranks 20..2000), like topical query words."""
+    rng = np.random.default_rng(seed)
+    return [" ".join(rng.choice(lexicon[20:2000], rng.integers(1, 3))) for _ in range(n)]
+
+def create_db(path: str) -> sqlite3.Connection:
+    con = sqlite3.connect(path)
+    con.executescript(SCHEMA)
+    return con
+
+def build_baseline(path, texts, sources):
+    con = create_db(path)
+    cur = con.cursor()
+    src2id = {}
+    for src in sorted(set(sources)):
+        cur.execute("INSERT INTO documents(source) VALUES (?)", (src,))
+        src2id[src] = cur.lastrowid
+    for cid, (t, s) in enumerate(zip(texts, sources)):
+        did = src2id[s]
+        cur.execute("INSERT INTO chunk_meta(chunk_id, doc_id, source) VALUES (?,?,?)", (cid, did, s))
+        cur.execute("INSERT INTO chunks_fts(rowid, text, chunk_id, doc_id) VALUES (?,?,?,?)", (cid, t, cid, did))
+    con.commit()
+    con.close()
+
+def build_engine(path, texts, sources):
+    con = create_db(path)
+    con.isolation_level = None
+    keyword_engine.tune_writer(con)
+    con.execute("BEGIN")
+    src2id = {}
+    for src in sorted(set(sources)):
+        src2id[src] = con.execute("INSERT INTO documents(source) VALUES (?)", (src,)).lastrowid
+    keyword_engine.bulk_insert(con, ((cid, src2id[s], s, t) for cid, (t, s) in enumerate(zip(texts, sources))))
+    con.execute("COMMIT")
+    keyword_engine.optimize(con)
+    con.close()
+
+def search_baseline(path, query, k):
+    """Cell 16 before keyword_engine: connect, query, close."""
+    con = sqlite3.connect(path)
+    con.row_factory = sqlite3.Row
+    try:
+        return con.execute(keyword_engine.SEARCH_SQL, (keyword_engine.fts_query(query), k)).fetchall()
+    finally:
+        con.close()
+
+def latency(fn, queries):
+    lat = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        lat.append(time.perf_counter() - t0)
+    lat = np.sort(np.array(lat) * 1000)
+    return lat[len(lat) // 2], lat[min(len(lat) - 1, int(0.99 * len(lat)))]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--chunks", type=int, default=100_000)
+    ap.add_argument("--words", type=int, default=150)
+    ap.add_argument("--queries", type=int, default=1000)
+    ap.add_argument("--k", type=int, default=10)
+    args = ap.parse_args()
+
+    texts, sources, lexicon = synthetic_corpus(args.chunks, args.words)
+    queries = make_queries(lexicon, args.queries)
+    print(f"{len(texts):,} chunks x ~{args.words} words, {len(queries)} queries, k={args.k}\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {"baseline": os.path.join(tmp, "baseline.db"), "engine": os.path.join(tmp, "engine.db")}
+        builds = {"baseline": build_baseline, "engine": build_engine}
+        build_s = {}
+        for name, build in builds.items():
+            t0 = time.perf_counter()
+            build(paths[name], texts, sources)
+            build_s[name] = time.perf_counter() - t0
+
+        engine = keyword_engine.KeywordEngine(paths["engine"])
+        searches = {
+            "baseline": lambda q: search_baseline(paths["baseline"], q, args.k),
+            "engine": lambda q: engine.search(q, k=args.k),
+        }
+        print(f"{'variant':<10} {'build s':>8} {'DB MB':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, fn in searches.items():
+            fn(queries[0])    # first-touch page faults out of the measurement
+            p50, p99 = latency(fn, queries)
+            mb = os.path.getsize(paths[name]) / 1e6
+            print(f"{name:<10} {build_s[name]:>8.1f} {mb:>8.1f} {p50:>8.3f} {p99:>8.3f}")
+        engine.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Memory-mapped chunk store.
+
+Chunk texts live in one UTF-8 blob addressed by an int64 (n, 2) [start, end)
+array indexed by chunk_id; the source PDF of each chunk is an int32 index into
+a list of source names, and a (n, 4) array holds (first page, last page, start,
+end) offsets into the extracted document text, -1 where unknown.
+
+Opening the store maps the files instead of parsing them, so start-up is
+instant, resident memory only grows with the chunks queries actually touch,
+and worker processes on the same host share the page cache.
+
+Updates append new texts to the blob and write the small per-chunk arrays as a
+new generation (chunks.offsets.<gen>.npy, ...); removed chunks become empty
+spans. The blob is compacted into a new file (chunks.<gen>.bin) once more than
+half of it is garbage. chunks.json names the blob and arrays of the committed
+generation and is replaced last, so a crash at any point leaves the previous
+generation intact; files no longer named by it are deleted after each commit.
+"""
+import json, mmap, os
+from collections.abc import Mapping
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+MANIFEST = "chunks.json"
+# Fixed names of stores written before generations; read once, then superseded by MANIFEST
+BLOB = "chunks.bin"
+OFFSETS = "chunks.offsets.npy"
+SOURCES = "chunks.src.npy"
+SOURCE_NAMES = "chunks.sources.json"
+POSITIONS = "chunks.pos.npy"
+
+def _blob_name(generation: int) -> str:
+    return f"chunks.{generation}.bin"
+
+def _read_manifest(index_dir: str) -> Dict | None:
+    """Files and source names of the committed generation (None if there is no store yet)."""
+    path = os.path.join(index_dir, MANIFEST)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    if not all(os.path.exists(os.path.join(index_dir, f)) for f in (BLOB, OFFSETS, SOURCES, SOURCE_NAMES)):
+        return None
+    with open(os.path.join(index_dir, SOURCE_NAMES), encoding="utf-8") as f:
+        names = json.load(f)
+    positions = POSITIONS if os.path.exists(os.path.join(index_dir, POSITIONS)) else None
+    return {"generation": 0, "blob": BLOB, "offsets": OFFSETS, "sources": SOURCES,
+            "positions": positions, "names": names}
+
+def exists(index_dir: str) -> bool:
+    return _read_manifest(index_dir) is not None
+
+class Writer:
+    """
+    Appends chunk texts to the blob as they arrive; nothing the committed
+    generation refers to changes until commit() replaces MANIFEST, so an aborted
+    build leaves at most some unreferenced bytes at the end of the blob (and
+    files of the unpublished generation, removed by the next commit).
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        m = _read_manifest(index_dir)
+        if m is not None:
+            self.offsets = np.load(os.path.join(index_dir, m["offsets"]))
+            self.src = np.load(os.path.join(index_dir, m["sources"]))
+            self.pos = _load_positions(index_dir, m["positions"], len(self.offsets))
+            self.names = m["names"]
+            self.generation = m["generation"]
+            self.blob_name = m["blob"]
+        else:
+            self.offsets = np.zeros((0, 2), dtype=np.int64)
+            self.src = np.zeros(0, dtype=np.int32)
+            self.pos = np.zeros((0, 4), dtype=np.int64)
+            self.names = []
+            self.generation = 0
+            self.blob_name = _blob_name(0)       # committed generations start at 1
+            open(os.path.join(index_dir, self.blob_name), "wb").close()
+        self.name_idx = {n: i for i, n in enumerate(self.names)}
+        self.blob = open(os.path.join(index_dir, self.blob_name), "ab")
+        self.blob_pos = self.blob.tell()
+
+    def _grow(self, n_ids: int):
+        if len(self.offsets) < n_ids:
+            grow = n_ids - len(self.offsets)
+            self.offsets = np.vstack([self.offsets, np.zeros((grow, 2), dtype=np.int64)])
+            self.src = np.concatenate([self.src, np.full(grow, -1, dtype=np.int32)])
+            self.pos = np.vstack([self.pos, np.full((grow, 4), -1, dtype=np.int64)])
+
+    def add(self, ids: np.ndarray, texts: List[str], source: str, positions: np.ndarray | None = None):
+        """positions: (len(ids), 4) first page, last page, start, end char offset (or None)."""
+        if not len(ids):
+            return
+        self._grow(int(ids.max()) + 1)
+        if source not in self.name_idx:
+            self.name_idx[source] = len(self.names)
+            self.names.append(source)
+        data = [t.encode("utf-8") for t in texts]
+        ends = self.blob_pos + np.cumsum([len(b) for b in data], dtype=np.int64)
+        self.blob.write(b"".join(data))
+        self.offsets[ids, 0] = ends - [len(b) for b in data]
+        self.offsets[ids, 1] = ends
+        self.blob_pos = int(ends[-1])
+        self.src[ids] = self.name_idx[source]
+        self.pos[ids] = -1 if positions is None else positions
+
+    def commit(self, n_ids: int, removed_ids: np.ndarray):
+        """Grow to `n_ids` chunk ids, blank `removed_ids`, and publish the result as a new generation."""
+        self.blob.close()
+        self._grow(n_ids)
+        self.offsets[removed_ids] = 0
+        self.src[removed_ids] = -1
+        self.pos[removed_ids] = -1
+
+        gen = self.generation + 1
+        blob_name = self.blob_name
+        live_bytes = int((self.offsets[:, 1] - self.offsets[:, 0]).sum())
+        if self.blob_pos > 2 * live_bytes and self.blob_pos > (1 << 20):
+            blob_name = _blob_name(gen)
+            self.offsets = _compact(self.index_dir, self.offsets, self.blob_name, blob_name)
+
+        m = {"generation": gen, "blob": blob_name, "offsets": f"chunks.offsets.{gen}.npy",
+             "sources": f"chunks.src.{gen}.npy", "positions": f"chunks.pos.{gen}.npy", "names": self.names}
+        np.save(os.path.join(self.index_dir, m["offsets"]), self.offsets)
+        np.save(os.path.join(self.index_dir, m["sources"]), self.src)
+        np.save(os.path.join(self.index_dir, m["positions"]), self.pos)
+        path = os.path.join(self.index_dir, MANIFEST)
+        with open(path + ".part", "w", encoding="utf-8") as f:
+            json.dump(m, f)
+        os.replace(path + ".part", path)           # the commit point
+        self.generation, self.blob_name = gen, blob_name
+        _remove_unreferenced(self.index_dir, m)
+
+    def abort(self):
+        self.blob.close()
+
+def update(index_dir: str, n_ids: int, removed_ids: np.ndarray,
+           added: Iterable[Tuple[np.ndarray, List[str], str]]):
+    """Grow to `n_ids` chunk ids, blank `removed_ids`, append `added` (ids, texts, source) groups."""
+    w = Writer(index_dir)
+    for ids, texts, source in added:
+        w.add(ids, texts, source)
+    w.commit(n_ids, removed_ids)
+
+def _load_positions(index_dir: str, name: str | None, n: int, mmap_mode: str | None = None) -> np.ndarray:
+    """Stores written before positions were recorded have none: all -1."""
+    if name is not None:
+        return np.load(os.path.join(index_dir, name), mmap_mode=mmap_mode)
+    return np.full((n, 4), -1, dtype=np.int64)
+
+def _compact(index_dir: str, offsets: np.ndarray, old_name: str, new_name: str) -> np.ndarray:
+    """Copy the live spans of blob `old_name` into `new_name`; returns their new offsets."""
+    new = np.zeros_like(offsets)
+    with open(os.path.join(index_dir, old_name), "rb") as old, open(os.path.join(index_dir, new_name), "wb") as out:
+        pos = 0
+        for i in np.flatnonzero(offsets[:, 1] > offsets[:, 0]):
+            s, e = offsets[i]
+            old.seek(s)
+            out.write(old.read(e - s))
+            new[i] = (pos, pos + e - s)
+            pos += e - s
+    return new
+
+def _remove_unreferenced(index_dir: str, manifest: Dict):
+    """Delete chunk files of older (or aborted) generations."""
+    keep = {MANIFEST, manifest["blob"], manifest["offsets"], manifest["sources"], manifest["positions"]}
+    for name in os.listdir(index_dir):
+        if name.startswith("chunks.") and name not in keep:
+            try:
+                os.remove(os.path.join(index_dir, name))
+            except OSError:      # still mapped by a reader on Windows: the next commit retries
+                pass
+
+class ChunkStore:
+    """
+    Read-only view; `texts[chunk_id]` and `metas[chunk_id]["source"]` work like the old lists.
+    metas also carry page / last_page / start / end when the build recorded them.
+    """
+
+    def __init__(self, index_dir: str):
+        for attempt in range(3):
+            m = _read_manifest(index_dir)
+            if m is None:
+                raise FileNotFoundError(f"no chunk store in {index_dir}")
+            try:
+                self._open(index_dir, m)
+                break
+            except FileNotFoundError:    # a commit replaced this generation while we were opening it
+                if attempt == 2:
+                    raise
+        self.n_live = int(np.count_nonzero(self.src >= 0))
+        self.texts = _Texts(self)
+        self.metas = _Metas(self)
+
+    def _open(self, index_dir: str, m: Dict):
+        self.offsets = np.load(os.path.join(index_dir, m["offsets"]), mmap_mode="r")
+        self.src = np.load(os.path.join(index_dir, m["sources"]), mmap_mode="r")
+        self.pos = _load_positions(index_dir, m["positions"], len(self.offsets), mmap_mode="r")
+        self.names = m["names"]
+        self._f = open(os.path.join(index_dir, m["blob"]), "rb")
+        size = os.fstat(self._f.fileno()).st_size
+        self.blob = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def text(self, chunk_id: int) -> str:
+        s, e = self.offsets[chunk_id]
+        if self.src[chunk_id] < 0:
+            raise KeyError(chunk_id)
+        return self.blob[s:e].decode("utf-8")
+
+    def source(self, chunk_id: int) -> str:
+        i = self.src[chunk_id]
+        if i < 0:
+            raise KeyError(chunk_id)
+        return self.names[i]
+
+    def meta(self, chunk_id: int) -> Dict:
+        m = {"source": self.source(chunk_id)}
+        page, last_page, start, end = (int(v) for v in self.pos[chunk_id])
+        if page >= 0:
+            m.update(page=page, last_page=last_page, start=start, end=end)
+        return m
+
+    def ids(self) -> np.ndarray:
+        return np.flatnonzero(self.src >= 0)
+
+    def close(self):
+        if isinstance(self.blob, mmap.mmap):
+            self.blob.close()
+        self._f.close()
+
+class _Texts(Mapping):
+    def __init__(self, store: ChunkStore):
+        self.store = store
+
+    def __getitem__(self, chunk_id) -> str:
+        return self.store.text(int(chunk_id))
+
+    def __len__(self) -> int:
+        return self.store.n_live
+
+    def __iter__(self):
+        return iter(int(i) for i in self.store.ids())
+
+class _Metas(_Texts):
+    def __getitem__(self, chunk_id) -> Dict:
+        return self.store.meta(int(chunk_id))
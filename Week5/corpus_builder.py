@@ -0,0 +1,185 @@
+"""
+Parallel PDF extraction + offset-based token chunking for the RAG build.
+
+Each PDF is extracted and chunked in a worker process (spawn; one tokenizer and
+page cache per worker, set up once by the pool initializer). Pages are
+tokenized with tiktoken's encode_ordinary_batch. Chunk boundaries are computed
+on the token array, and every chunk is sliced out of the document text by
+character offsets derived from token byte lengths: no decode per 512-token
+window. Each chunk carries its first/last page (1-based) and [start, end)
+character offsets into the document text ("\\n".join(pages)).
+
+iter_documents() yields (path, chunks) as workers finish, so the builder can
+embed and write them while the remaining PDFs are still being processed. At most
+IN_FLIGHT_PER_WORKER PDFs per worker are submitted at a time, so finished
+results never pile up in the parent faster than the builder consumes them.
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import multiprocessing as mp
+from typing import Iterator, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+CHARS_PER_TOKEN = 4          # fallback window size when tiktoken is unavailable
+IN_FLIGHT_PER_WORKER = 2     # PDFs submitted but not yet yielded, per worker
+
+class Chunk(NamedTuple):
+    text: str
+    page: int          # first page (1-based)
+    last_page: int
+    start: int         # [start, end) char offsets into "\n".join(pages)
+    end: int
+
+def load_encoding(name: str = "cl100k_base"):
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception:
+        return None
+
+class TokenChunker:
+    """~max_tokens windows with overlap_tokens overlap, cut by character offsets."""
+
+    def __init__(self, encoding=None, max_tokens: int = 512, overlap_tokens: int = 64):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.enc = encoding
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self._token_bytes = None
+
+    def _byte_lengths(self) -> np.ndarray:
+        """UTF-8 byte length of every token id (built once per process)."""
+        if self._token_bytes is None:
+            lens = np.zeros(self.enc.n_vocab, dtype=np.int64)
+            for t in range(self.enc.n_vocab):
+                try:
+                    lens[t] = len(self.enc.decode_single_token_bytes(t))
+                except KeyError:   # unused ids in the vocabulary
+                    pass
+            self._token_bytes = lens
+        return self._token_bytes
+
+    def _windows(self, n: int) -> List[Tuple[int, int]]:
+        step = self.max_tokens - self.overlap_tokens
+        out, start = [], 0
+        while start < n:
+            end = min(start + self.max_tokens, n)
+            out.append((start, end))
+            if end == n:
+                break
+            start += step
+        return out
+
+    def _token_char_starts(self, pages: List[str]) -> np.ndarray:
+        """Char offset (into the joined document) of every token, plus the document length at the end."""
+        lens = self._byte_lengths()
+        starts, base = [], 0
+        for page, toks in zip(pages, self.enc.encode_ordinary_batch(pages)):
+            byte_pos = np.concatenate([[0], np.cumsum(lens[np.asarray(toks, dtype=np.int64)])])[:-1]
+            if page.isascii():
+                starts.append(base + byte_pos)
+            else:
+                raw = np.frombuffer(page.encode("utf-8", "surrogatepass"), dtype=np.uint8)
+                # chars that begin before each byte position (UTF-8 continuation bytes are 10xxxxxx)
+                chars_before = np.concatenate([[0], np.cumsum((raw & 0xC0) != 0x80)])
+                starts.append(base + chars_before[np.minimum(byte_pos, len(raw))])
+            base += len(page) + 1                              # + "\n" between pages
+        starts.append([max(0, base - 1)])
+        return np.concatenate(starts).astype(np.int64)
+
+    def chunk_pages(self, pages: List[str]) -> List[Chunk]:
+        text = "\n".join(pages)
+        page_starts = np.cumsum([0] + [len(p) + 1 for p in pages[:-1]])
+        if self.enc is not None:
+            char_at = self._token_char_starts(pages)
+            bounds = [(int(char_at[s]), int(char_at[e])) for s, e in self._windows(len(char_at) - 1)]
+        else:
+            bounds = self._char_windows(text)
+
+        chunks = []
+        for s, e in bounds:
+            if not text[s:e].strip():
+                continue
+            first = int(np.searchsorted(page_starts, s, side="right"))
+            last = int(np.searchsorted(page_starts, max(s, e - 1), side="right"))
+            chunks.append(Chunk(text[s:e], first, last, s, e))
+        return chunks
+
+    def chunk(self, text: str) -> List[Chunk]:
+        return self.chunk_pages([text])
+
+    def _char_windows(self, text: str) -> List[Tuple[int, int]]:
+        """~4 chars/token windows over the raw text, ends moved back to whitespace where possible."""
+        size = self.max_tokens * CHARS_PER_TOKEN
+        overlap = self.overlap_tokens * CHARS_PER_TOKEN
+        out, start = [], 0
+        while start < len(text):
+            end = min(start + size, len(text))
+            if end < len(text):
+                cut = text.rfind(" ", start + size - overlap, end)
+                end = cut if cut > start else end
+            out.append((start, end))
+            if end == len(text):
+                break
+            start = max(start + 1, end - overlap)
+        return out
+
+# =========================
+# Worker process
+# =========================
+_chunker: TokenChunker | None = None
+_page_cache = None
+
+def extract_pages(path: str, page_cache=None) -> List[str]:
+    """Page texts: Week2's text-layer-first/OCR extractor when importable, else PyMuPDF."""
+    try:
+        import pdf_extract
+    except ImportError:
+        pdf_extract = None
+    if pdf_extract is not None:
+        return [p["text"] for p in pdf_extract.extract_pages(path, cache=page_cache)]
+    import fitz
+    with fitz.open(path) as doc:
+        return [p.get_text("text") for p in doc]
+
+def _init_worker(encoding_name: str | None, max_tokens: int, overlap_tokens: int, page_cache_path: str | None):
+    global _chunker, _page_cache
+    enc = load_encoding(encoding_name) if encoding_name else None
+    _chunker = TokenChunker(enc, max_tokens, overlap_tokens)
+    if page_cache_path:
+        try:
+            import pdf_extract
+            _page_cache = pdf_extract.PageCache(page_cache_path)
+        except ImportError:
+            _page_cache = None
+
+def process_pdf(path: str) -> Tuple[str, List[Chunk]]:
+    return path, _chunker.chunk_pages(extract_pages(path, _page_cache))
+
+# =========================
+# Parent side
+# =========================
+def iter_documents(paths: Sequence[str], workers: int = 1, encoding_name: str | None = "cl100k_base",
+                   max_tokens: int = 512, overlap_tokens: int = 64,
+                   page_cache_path: str | None = None) -> Iterator[Tuple[str, List[Chunk]]]:
+    """Yield (path, chunks) per PDF in completion order; workers <= 1 runs in-process."""
+    init = (encoding_name, max_tokens, overlap_tokens, page_cache_path)
+    if workers <= 1 or len(paths) <= 1:
+        _init_worker(*init)
+        for p in paths:
+            yield process_pdf(p)
+        return
+    workers = min(workers, len(paths))
+    todo = iter(paths)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                             initializer=_init_worker, initargs=init) as pool:
+        pending = {pool.submit(process_pdf, p) for _, p in zip(range(workers * IN_FLIGHT_PER_WORKER), todo)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            while done:
+                result = done.pop().result()      # the finished future (and its pickled result) is released here
+                next_path = next(todo, None)
+                if next_path is not None:
+                    pending.add(pool.submit(process_pdf, next_path))
+                yield result
@@ -0,0 +1,196 @@
+"""
+Embedding service for the RAG build.
+
+- Cache: (model name, sha1 of chunk text) → row of a memory-mapped float32 matrix,
+  with the key → row map in SQLite. Re-scraped papers and v1/v2 duplicates are
+  never embedded twice, across runs.
+- Dynamic batching: cache misses are sorted by length and grouped so every batch
+  holds about the same number of tokens (short chunks → big batches, no padding waste).
+- Multi-process CPU encoding through SentenceTransformer.start_multi_process_pool
+  for large jobs; small calls (queries) stay in-process.
+
+One writer per cache directory (the notebook kernel); readers may share it.
+"""
+import hashlib, os, re, sqlite3, time
+from typing import List
+
+import numpy as np
+
+CHARS_PER_TOKEN = 4            # estimate; good enough to group similar lengths
+MIN_POOL_TEXTS = 256           # below this, pool start-up/IPC costs more than it saves
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+class EmbeddingCache:
+    GROW_ROWS = 4096
+
+    def __init__(self, cache_dir: str, model_name: str, dim: int):
+        self.dir = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+        os.makedirs(self.dir, exist_ok=True)
+        self.dim = dim
+        self.vec_path = os.path.join(self.dir, "vectors.f32")
+        self.con = sqlite3.connect(os.path.join(self.dir, "keys.sqlite"))
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("CREATE TABLE IF NOT EXISTS keys (hash BLOB PRIMARY KEY, row INTEGER NOT NULL)")
+        self.n = self.con.execute("SELECT COUNT(*) FROM keys").fetchone()[0]
+        if not os.path.exists(self.vec_path):
+            open(self.vec_path, "wb").close()
+        self._map()
+
+    def _map(self):
+        rows = os.path.getsize(self.vec_path) // (4 * self.dim)
+        self.capacity = rows
+        self.vecs = np.memmap(self.vec_path, dtype="float32", mode="r+", shape=(rows, self.dim)) if rows else None
+
+    def _reserve(self, rows: int):
+        if rows <= self.capacity:
+            return
+        new_rows = max(rows, self.capacity * 2, self.GROW_ROWS)
+        if self.vecs is not None:
+            self.vecs.flush()
+            del self.vecs
+        with open(self.vec_path, "r+b") as f:
+            f.truncate(new_rows * 4 * self.dim)
+        self._map()
+
+    def lookup(self, keys: List[bytes]) -> np.ndarray:
+        """Row per key, -1 where missing."""
+        found = {}
+        distinct = list(dict.fromkeys(keys))
+        for s in range(0, len(distinct), 900):   # stay under SQLite's bound-variable limit
+            part = distinct[s:s + 900]
+            q = f"SELECT hash, row FROM keys WHERE hash IN ({','.join('?' * len(part))})"
+            found.update(self.con.execute(q, part))
+        return np.array([found.get(k, -1) for k in keys], dtype=np.int64)
+
+    def get(self, rows: np.ndarray) -> np.ndarray:
+        return np.asarray(self.vecs[rows])
+
+    def add(self, keys: List[bytes], vecs: np.ndarray):
+        start = self.n
+        self._reserve(start + len(keys))
+        self.vecs[start:start + len(keys)] = vecs
+        self.vecs.flush()                      # vectors on disk before the keys point at them
+        with self.con:
+            self.con.executemany("INSERT OR IGNORE INTO keys(hash, row) VALUES (?, ?)",
+                                 [(k, start + i) for i, k in enumerate(keys)])
+        self.n = start + len(keys)
+
+    def close(self):
+        if self.vecs is not None:
+            self.vecs.flush()
+        self.con.close()
+
+class EmbeddingService:
+    def __init__(self, model_name: str, cache_dir: str | None = None, workers: int = 1,
+                 tokens_per_batch: int = 16384, device: str | None = None):
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name, device=device)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.max_tokens = self.model.max_seq_length or 512
+        self.tokens_per_batch = tokens_per_batch
+        self.workers = workers
+        self.pool = None
+        self.cache = EmbeddingCache(cache_dir, model_name, self.dim) if cache_dir else None
+        self.requested = 0
+        self.hits = 0
+        self.encoded = 0
+        self.encode_s = 0.0
+
+    # ----------------------------- batching -----------------------------
+    def _est_tokens(self, text: str) -> int:
+        return min(self.max_tokens, len(text) // CHARS_PER_TOKEN + 2)
+
+    def length_batches(self, texts: List[str]):
+        """Yield (indices, batch_size) runs over `texts`, longest first, ~tokens_per_batch each."""
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        s = 0
+        while s < len(order):
+            longest = self._est_tokens(texts[order[s]])
+            bs = max(1, self.tokens_per_batch // longest)
+            yield order[s:s + bs], bs
+            s += bs
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        out = np.empty((len(texts), self.dim), dtype="float32")
+        if not texts:
+            return out
+        t0 = time.perf_counter()
+        if self.workers > 1 and len(texts) >= MIN_POOL_TEXTS:
+            if self.pool is None:
+                self.pool = self.model.start_multi_process_pool(["cpu"] * self.workers)
+            # Group consecutive same-size batches into one pool call; each worker
+            # gets length-homogeneous chunks of `bs` texts
+            runs, cur, cur_bs = [], [], None
+            for idx, bs in self.length_batches(texts):
+                if cur_bs is not None and bs != cur_bs:
+                    runs.append((cur, cur_bs))
+                    cur = []
+                cur.extend(idx)
+                cur_bs = bs
+            runs.append((cur, cur_bs))
+            for idx, bs in runs:
+                out[idx] = self.model.encode_multi_process(
+                    [texts[i] for i in idx], self.pool, batch_size=bs, chunk_size=bs,
+                    normalize_embeddings=True)
+        else:
+            for idx, bs in self.length_batches(texts):
+                out[idx] = self.model.encode([texts[i] for i in idx], batch_size=bs,
+                                             normalize_embeddings=True, show_progress_bar=False)
+        self.encode_s += time.perf_counter() - t0
+        self.encoded += len(texts)
+        return out
+
+    # ----------------------------- API -----------------------------
+    def embed(self, texts: List[str], persist: bool = True) -> np.ndarray:
+        """Normalized float32 (len(texts), dim), from the cache where possible."""
+        self.requested += len(texts)
+        if self.cache is None:
+            return self._encode(list(texts))
+
+        keys = [text_key(t) for t in texts]
+        rows = self.cache.lookup(keys)
+        out = np.empty((len(texts), self.dim), dtype="float32")
+        hit = rows >= 0
+        if hit.any():
+            out[hit] = self.cache.get(rows[hit])
+        self.hits += int(hit.sum())
+
+        # Encode each distinct missing text once
+        first = {}
+        for i in np.flatnonzero(~hit):
+            first.setdefault(keys[i], i)
+        todo = list(first.values())
+        vecs = self._encode([texts[i] for i in todo])
+        lookup = dict(zip(first, vecs))
+        for i in np.flatnonzero(~hit):
+            out[i] = lookup[keys[i]]
+        if persist and todo:
+            self.cache.add(list(first), vecs)
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "requested": self.requested,
+            "cache_hits": self.hits,
+            "hit_rate": round(self.hits / self.requested, 3) if self.requested else None,
+            "encoded": self.encoded,
+            "encode_s": round(self.encode_s, 2),
+            "chunks_per_s": round(self.encoded / self.encode_s, 1) if self.encode_s else None,
+            "cached_vectors": self.cache.n if self.cache else 0,
+        }
+
+    def report(self) -> str:
+        s = self.stats()
+        return (f"embeddings: {s['requested']} requested, {s['cache_hits']} cached "
+                f"(hit rate {s['hit_rate']}), {s['encoded']} encoded in {s['encode_s']}s "
+                f"({s['chunks_per_s']} chunks/s)")
+
+    def close(self):
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
+        if self.cache is not None:
+            self.cache.close()
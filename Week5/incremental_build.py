@@ -0,0 +1,425 @@
+"""
+Incremental RAG index build.
+
+A manifest table in rag.db maps every PDF to its content hash and the range of
+chunk IDs it owns. On each run only added or changed PDFs are extracted, chunked
+and embedded; their vectors are added with add_with_ids, and the
+chunks of changed or deleted PDFs are removed from the index, the embedding
+matrix and the FTS tables in place.
+
+Artifacts (INDEX_DIR):
+- rag.db       documents / chunk_meta / chunks_fts (as before) + files manifest + build_meta
+- arxiv.index  configured ANN index with explicit ids: faiss id == chunk_id == FTS rowid
+               (IndexIDMap2 around flat/HNSW; IVF indexes store ids natively)
+- embs.npy     float32 (>= next_chunk_id, dim); row i is chunk i (zeros for removed chunks).
+               Updated in place through a memmap: a run writes only its new rows and
+               zeroes the removed ones, so its cost doesn't grow with the corpus
+- chunks.*     memory-mapped chunk texts/sources/page offsets indexed by chunk_id (see chunk_store.py)
+
+Chunk IDs are never reused, so a crash between writing the index and committing
+rag.db is repaired by the next run: uncommitted IDs are handed out again and
+cleared from the index before being re-added.
+"""
+import hashlib, io, json, os, sqlite3, time
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+import faiss
+
+import ann_index, chunk_store, keyword_engine
+
+EMBED_BATCH_CHUNKS = 2048     # chunks gathered across documents per embed() call
+# ANN_CONFIG keys baked into the index at build time; the others (nprobe, ef_search,
+# rescore) are query-time knobs and never force a rebuild
+BUILD_PARAMS = ("kind", "nlist", "pq_m", "pq_nbits", "hnsw_m", "ef_construction")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+  doc_id   INTEGER PRIMARY KEY,
+  source   TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunk_meta (
+  chunk_id INTEGER PRIMARY KEY,
+  doc_id   INTEGER NOT NULL,
+  source   TEXT NOT NULL,
+  FOREIGN KEY(doc_id) REFERENCES documents(doc_id)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+  text,
+  chunk_id UNINDEXED,
+  doc_id   UNINDEXED,
+  tokenize='porter'
+);
+CREATE TABLE IF NOT EXISTS files (
+  source      TEXT PRIMARY KEY,
+  sha256      TEXT NOT NULL,
+  size        INTEGER NOT NULL,
+  mtime       REAL NOT NULL,
+  doc_id      INTEGER NOT NULL,
+  first_chunk INTEGER NOT NULL,
+  n_chunks    INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS build_meta (
+  key   TEXT PRIMARY KEY,
+  value TEXT NOT NULL
+);
+"""
+
+def file_sha256(path: str, bufsize: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(bufsize):
+            h.update(chunk)
+    return h.hexdigest()
+
+class _Chunks:
+    """One document's chunks with their assigned ids; texts only, or corpus_builder.Chunk tuples."""
+
+    def __init__(self, chunks: List, first_id: int):
+        self.texts = [c if isinstance(c, str) else c.text for c in chunks]
+        self.ids = np.arange(first_id, first_id + len(chunks), dtype="int64")
+        self.positions = None
+        if chunks and not isinstance(chunks[0], str):
+            self.positions = np.array([(c.page, c.last_page, c.start, c.end) for c in chunks], dtype=np.int64)
+
+class IncrementalBuilder:
+    def __init__(self, index_dir: str, ann_config: Dict):
+        self.index_dir = index_dir
+        self.ann_config = dict(ann_config)
+        self.db_path = os.path.join(index_dir, "rag.db")
+        self.index_path = os.path.join(index_dir, "arxiv.index")
+        self.embs_path = os.path.join(index_dir, "embs.npy")
+        os.makedirs(index_dir, exist_ok=True)
+
+        con = self._connect()
+        con.executescript(SCHEMA)
+        # A rag.db/arxiv.index from the old full-rebuild cells has no manifest: start over once
+        legacy = (con.execute("SELECT COUNT(*) FROM files").fetchone()[0] == 0
+                  and con.execute("SELECT COUNT(*) FROM chunk_meta").fetchone()[0] > 0)
+        if legacy:
+            con.executescript("DELETE FROM documents; DELETE FROM chunk_meta; DELETE FROM chunks_fts;")
+            for p in (self.index_path, self.embs_path):
+                if os.path.exists(p):
+                    os.remove(p)
+        con.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(self.db_path, isolation_level=None)
+        keyword_engine.tune_writer(con)
+        return con
+
+    @staticmethod
+    def _meta(con, key: str, default: int = 0) -> int:
+        row = con.execute("SELECT value FROM build_meta WHERE key = ?", (key,)).fetchone()
+        return int(row[0]) if row else default
+
+    @staticmethod
+    def _set_meta(con, key: str, value: int | str):
+        con.execute("INSERT OR REPLACE INTO build_meta(key, value) VALUES (?, ?)", (key, str(value)))
+
+    @staticmethod
+    def _meta_text(con, key: str) -> str | None:
+        row = con.execute("SELECT value FROM build_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _index_config(self) -> str:
+        cfg = {k: self.ann_config[k] for k in BUILD_PARAMS if self.ann_config.get(k) is not None}
+        cfg.setdefault("kind", "flat")
+        return json.dumps(cfg, sort_keys=True)
+
+    def _build_params(self) -> Dict:
+        return {k: v for k, v in self.ann_config.items() if k not in ("kind", "rescore")}
+
+    def _needs_rebuild(self, con) -> bool:
+        """True when arxiv.index was built with other BUILD_PARAMS than ann_config asks for."""
+        if not (os.path.exists(self.index_path) and os.path.exists(self.embs_path)):
+            return False
+        stored = self._meta_text(con, "index_config")
+        if stored is None:
+            # Built before the config was recorded: all we can compare is the kind on disk
+            return ann_index.index_kind(ann_index.load_index(self.index_path)) != self.ann_config.get("kind", "flat")
+        return stored != self._index_config()
+
+    @property
+    def version(self) -> int:
+        """Bumped on every update that changes the index; use it to key downstream caches."""
+        con = self._connect()
+        try:
+            return self._meta(con, "index_version")
+        finally:
+            con.close()
+
+    # ----------------------------- diff -----------------------------
+    def _scan(self, con, pdf_dir: str):
+        manifest = {r[0]: r for r in con.execute(
+            "SELECT source, sha256, size, mtime, doc_id, first_chunk, n_chunks FROM files")}
+        todo, unchanged, touched = [], set(), []
+        for name in sorted(os.listdir(pdf_dir)):
+            if not name.lower().endswith(".pdf"):
+                continue
+            path = os.path.join(pdf_dir, name)
+            st = os.stat(path)
+            old = manifest.get(name)
+            if old is not None and old[2] == st.st_size and old[3] == st.st_mtime:
+                unchanged.add(name)           # size+mtime match: skip hashing
+                continue
+            sha = file_sha256(path)
+            if old is not None and old[1] == sha:
+                unchanged.add(name)
+                touched.append((st.st_size, st.st_mtime, name))
+                continue
+            todo.append((name, path, sha, st.st_size, st.st_mtime))
+        stale = [r for name, r in manifest.items() if name not in unchanged]
+        return todo, stale, touched
+
+    # ----------------------------- update -----------------------------
+    def update(self, pdf_dir: str, extract: Callable[[str], str] | None = None,
+               chunk: Callable[[str], List[str]] | None = None,
+               embed: Callable[[List[str]], np.ndarray] | None = None,
+               documents: Callable[[List[str]], Iterable[Tuple[str, List]]] | None = None) -> Dict:
+        """
+        Bring the index, embeddings and FTS tables in line with `pdf_dir`.
+
+        Chunks come from `documents(paths)` -> (path, chunks) in any order (e.g.
+        corpus_builder.iter_documents), or from chunk(extract(path)) one file at a time.
+        Chunks may be strings or corpus_builder.Chunk tuples (page numbers and offsets
+        are kept). They are embedded and written in batches of ~EMBED_BATCH_CHUNKS as
+        they arrive, so only the vectors of the run are held in memory, not its texts.
+        """
+        if documents is None:
+            if extract is None or chunk is None:
+                raise ValueError("pass documents=..., or both extract and chunk")
+            documents = lambda paths: ((p, chunk(extract(p))) for p in paths)
+        t0 = time.perf_counter()
+        con = self._connect()
+        todo, stale, touched = self._scan(con, pdf_dir)
+        con.executemany("UPDATE files SET size = ?, mtime = ? WHERE source = ?", touched)
+        rebuild = self._needs_rebuild(con)
+        report = {"added_or_changed": len(todo), "removed_or_replaced": len(stale),
+                  "new_chunks": 0, "removed_chunks": 0, "index_rebuilt": rebuild}
+        if not todo and not stale and not rebuild:
+            con.close()
+            report["seconds"] = round(time.perf_counter() - t0, 2)
+            return report
+
+        files = {path: (name, sha, size, mtime) for name, path, sha, size, mtime in todo}
+
+        con.execute("BEGIN IMMEDIATE")
+        store = None
+        try:
+            next_id = self._meta(con, "next_chunk_id")
+
+            # Remove chunks of changed/deleted files
+            removed = []
+            for source, _, _, _, doc_id, first, n in stale:
+                if n:
+                    removed.append(np.arange(first, first + n, dtype="int64"))
+                    con.execute("DELETE FROM chunks_fts WHERE rowid BETWEEN ? AND ?", (first, first + n - 1))
+                    con.execute("DELETE FROM chunk_meta WHERE chunk_id BETWEEN ? AND ?", (first, first + n - 1))
+                con.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+                con.execute("DELETE FROM files WHERE source = ?", (source,))
+            removed_ids = np.concatenate(removed) if removed else np.empty(0, dtype="int64")
+            report["removed_chunks"] = len(removed_ids)
+
+            # Extract → chunk → embed only the files that need it, writing as documents arrive
+            self._ensure_chunk_store(con)
+            store = chunk_store.Writer(self.index_dir)
+            added_ids, buffer = [], []
+
+            def flush():
+                texts = [t for _, _, chunks in buffer for t in chunks.texts]
+                vecs = embed(texts) if texts else None
+                at = 0
+                for name, doc_id, chunks in buffer:
+                    ids = chunks.ids
+                    keyword_engine.bulk_insert(con, ((int(i), doc_id, name, t) for i, t in zip(ids, chunks.texts)))
+                    store.add(ids, chunks.texts, name, chunks.positions)
+                    if len(ids):
+                        added_ids.append((ids, vecs[at:at + len(ids)]))
+                    at += len(ids)
+                    print(f"[+] {name}: {len(ids)} chunks")
+                report["new_chunks"] += at
+                buffer.clear()
+
+            for path, chunks in documents([t[1] for t in todo]):
+                name, sha, size, mtime = files[path]
+                doc_id = con.execute("INSERT INTO documents(source) VALUES (?)", (name,)).lastrowid
+                chunks = _Chunks(chunks, next_id)
+                con.execute("INSERT INTO files(source, sha256, size, mtime, doc_id, first_chunk, n_chunks) "
+                            "VALUES (?,?,?,?,?,?,?)", (name, sha, size, mtime, doc_id, next_id, len(chunks.ids)))
+                next_id += len(chunks.ids)
+                buffer.append((name, doc_id, chunks))
+                if sum(len(c.ids) for _, _, c in buffer) >= EMBED_BATCH_CHUNKS:
+                    flush()
+            flush()
+
+            dim = added_ids[0][1].shape[1] if added_ids else self._stored_dim()
+            embs = self._update_embs(dim, next_id, added_ids) if dim is not None else None
+            live = np.fromiter((r[0] for r in con.execute("SELECT chunk_id FROM chunk_meta ORDER BY chunk_id")),
+                               dtype="int64")
+            # No chunks at all (only text-less PDFs so far, or every PDF removed) leaves
+            # no index file, as before the first build
+            index = None
+            if len(live):
+                index = None if rebuild else self._load_index()
+                if index is None:
+                    # First build, or ANN_CONFIG changed: index the stored embeddings, no re-embedding
+                    index = self._rebuild_index(embs, live, self.ann_config.get("kind", "flat"))
+                    if rebuild:
+                        print(f"[ann] rebuilt index as {ann_index.index_kind(index)} ({index.ntotal} vectors)")
+                else:
+                    index = self._apply_to_index(index, embs, live, removed_ids, added_ids)
+
+            self._set_meta(con, "index_config", self._index_config())
+            self._set_meta(con, "next_chunk_id", next_id)
+            self._set_meta(con, "index_version", self._meta(con, "index_version") + 1)
+
+            # Files first (atomic replace; new embs rows are past the committed next_chunk_id),
+            # then the manifest commit makes them official
+            store.commit(next_id, removed_ids)
+            store = None
+            if index is not None:
+                tmp = self.index_path + ".part"
+                ann_index.write_index(index, tmp)
+                os.replace(tmp, self.index_path)
+            elif os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            con.execute("COMMIT")
+        except BaseException:
+            if store is not None:
+                store.abort()
+            con.execute("ROLLBACK")
+            raise
+        else:
+            if embs is not None and len(removed_ids):
+                # only once nothing committed refers to them (a crash here just leaves stale rows)
+                embs[removed_ids] = 0.0
+                embs.flush()
+            if report["new_chunks"] >= keyword_engine.OPTIMIZE_MIN_CHUNKS:
+                keyword_engine.optimize(con)
+        finally:
+            con.close()
+
+        report["total_chunks"] = int(index.ntotal) if index is not None else 0
+        report["seconds"] = round(time.perf_counter() - t0, 2)
+        return report
+
+    def _load_index(self) -> faiss.Index | None:
+        """The index on disk, or None when there is none that can be updated by id."""
+        if not os.path.exists(self.index_path):
+            return None
+        index = ann_index.load_index(self.index_path, nprobe=self.ann_config.get("nprobe"),
+                                     ef_search=self.ann_config.get("ef_search"))
+        if isinstance(index, ann_index.BinaryIndex) or \
+                isinstance(faiss.downcast_index(index), (faiss.IndexIDMap2, faiss.IndexIVF)):
+            return index
+        return None
+
+    def _rebuild_index(self, embs: np.ndarray, live: np.ndarray, kind: str) -> faiss.Index:
+        """Fresh index of `kind` over the rows `live` (non-empty) of `embs`, trained on them if needed."""
+        vecs = np.ascontiguousarray(embs[live], dtype="float32")
+        index = self._with_ids(ann_index.new_index(embs.shape[1], kind, train=vecs, **self._build_params()))
+        index.add_with_ids(vecs, live)
+        return index
+
+    @staticmethod
+    def _with_ids(index: faiss.Index) -> faiss.Index:
+        # IndexIDMap.remove_ids assumes the inner index renumbers like IndexFlat;
+        # IVF doesn't, but it stores arbitrary ids itself (BinaryIndex carries its own id map)
+        if isinstance(index, (faiss.IndexIVF, ann_index.BinaryIndex)):
+            return index
+        return faiss.IndexIDMap2(index)
+
+    def _stored_dim(self) -> int | None:
+        if not os.path.exists(self.embs_path):
+            return None
+        return np.load(self.embs_path, mmap_mode="r").shape[1]
+
+    def _update_embs(self, dim: int, n_rows: int, added_ids) -> np.memmap:
+        """Write the run's vectors into embs.npy in place, grown to at least `n_rows` rows."""
+        embs = self._open_embs(dim, n_rows)
+        for ids, vecs in added_ids:
+            embs[ids] = vecs
+        embs.flush()
+        return embs
+
+    def _open_embs(self, dim: int, n_rows: int) -> np.memmap:
+        """embs.npy as a writable memmap; growing it appends zero rows and rewrites the header only."""
+        fmt = np.lib.format
+        if not os.path.exists(self.embs_path):
+            return fmt.open_memmap(self.embs_path, mode="w+", dtype="float32", shape=(n_rows, dim))
+        with open(self.embs_path, "r+b") as f:
+            version = fmt.read_magic(f)
+            read_header = fmt.read_array_header_1_0 if version == (1, 0) else fmt.read_array_header_2_0
+            shape, _, _ = read_header(f)
+            if shape[0] >= n_rows:
+                return np.load(self.embs_path, mmap_mode="r+")
+            offset = f.tell()
+            header = io.BytesIO()
+            write_header = fmt.write_array_header_1_0 if version == (1, 0) else fmt.write_array_header_2_0
+            write_header(header, {"descr": "<f4", "fortran_order": False, "shape": (n_rows, dim)})
+            in_place = len(header.getvalue()) == offset
+            if in_place:
+                # numpy pads headers so the row count can grow in place. Rows first, then the
+                # header: a crash in between leaves bytes past the old shape, which readers ignore
+                f.truncate(offset + n_rows * dim * 4)
+                f.seek(0)
+                f.write(header.getvalue())
+        if not in_place:
+            # header would change size (numpy without growth padding): copy once into a new file
+            old = np.load(self.embs_path, mmap_mode="r")
+            tmp = self.embs_path + ".part"
+            new = fmt.open_memmap(tmp, mode="w+", dtype="float32", shape=(n_rows, dim))
+            step = EMBED_BATCH_CHUNKS * 16
+            for start in range(0, len(old), step):
+                new[start:start + step] = old[start:start + step]
+            new.flush()
+            del old, new
+            os.replace(tmp, self.embs_path)
+        return np.load(self.embs_path, mmap_mode="r+")
+
+    def _apply_to_index(self, index, embs, live, removed_ids, added_ids) -> faiss.Index:
+        new_ids = np.concatenate([i for i, _ in added_ids]) if added_ids else np.empty(0, dtype="int64")
+        if ann_index.index_kind(index) == "hnsw" and index.ntotal != len(live) - len(new_ids):
+            # HNSW graphs can't delete (removals, or leftovers of a crashed run):
+            # rebuild from the stored embeddings instead, no re-embedding
+            return self._rebuild_index(embs, live, "hnsw")
+        gone = np.concatenate([removed_ids, new_ids])   # new_ids too: clears leftovers of a crashed run
+        if len(gone) and ann_index.index_kind(index) != "hnsw":
+            index.remove_ids(gone)
+        if len(new_ids):
+            index.add_with_ids(embs[new_ids], new_ids)
+        return index
+
+    # ----------------------------- load -----------------------------
+    def _ensure_chunk_store(self, con):
+        """Indexes built before the chunk store existed: export their chunks from rag.db once."""
+        if chunk_store.exists(self.index_dir):
+            return
+        rows = con.execute("""
+            SELECT cm.chunk_id, cm.source, c.text
+            FROM chunk_meta cm JOIN chunks_fts c ON c.rowid = cm.chunk_id
+            ORDER BY cm.chunk_id
+        """).fetchall()
+        chunk_store.update(self.index_dir, self._meta(con, "next_chunk_id"), np.empty(0, dtype="int64"),
+                           [(np.array([r[0]]), [r[2]], r[1]) for r in rows])
+
+    def load(self) -> Tuple[faiss.Index, Mapping, Mapping, np.ndarray]:
+        """
+        (index, docs, metadatas, embs), all memory-mapped: docs[chunk_id] -> text,
+        metadatas[chunk_id] -> {"source": ...}, embs[chunk_id] -> vector.
+        Compact indexes (sq8, binary) come wrapped in a Rescorer over embs.
+        """
+        index = ann_index.load_index(self.index_path, nprobe=self.ann_config.get("nprobe"),
+                                     ef_search=self.ann_config.get("ef_search"))
+        if not chunk_store.exists(self.index_dir):
+            con = self._connect()
+            try:
+                self._ensure_chunk_store(con)
+            finally:
+                con.close()
+        store = chunk_store.ChunkStore(self.index_dir)
+        embs = np.load(self.embs_path, mmap_mode="r")
+        index = ann_index.with_rescoring(index, embs, self.ann_config.get("rescore"))
+        return index, store.texts, store.metas, embs
@@ -0,0 +1,138 @@
+"""
+SQLite FTS5 keyword engine for the RAG notebook.
+
+Queries: one read-only connection per thread, opened once and reused, tuned
+with mmap_size / cache_size so the FTS b-trees are served from mapped pages
+instead of read() calls. The search SQL is a fixed string, so sqlite3's
+per-connection statement cache keeps it prepared across queries. rag.db is in
+WAL mode (the builder sets it), so readers never block on, or get blocked by,
+an update; every query sees the latest committed build.
+
+Build: rows go in through executemany in large batches inside the caller's
+transaction, and a big load is followed by the FTS5 'optimize' command, which
+merges the segment b-trees the inserts left behind into one.
+"""
+import re, sqlite3, threading
+from typing import Dict, Iterable, List, Tuple
+
+MMAP_BYTES = 256 << 20        # map up to 256 MB of rag.db per connection
+CACHE_KIB = 64 << 10          # 64 MB page cache per connection
+INSERT_BATCH = 50_000         # rows per executemany call
+OPTIMIZE_MIN_CHUNKS = 5_000   # smaller updates are left to FTS5's automerge
+
+SEARCH_SQL = """
+    SELECT c.rowid AS chunk_id, cm.source, c.text, bm25(chunks_fts) AS bm25
+    FROM chunks_fts c
+    JOIN chunk_meta cm ON cm.chunk_id = c.rowid
+    WHERE chunks_fts MATCH ?
+    ORDER BY bm25 ASC
+    LIMIT ?
+"""
+# bm25() may not exist on very old SQLite builds
+SEARCH_SQL_NO_BM25 = """
+    SELECT c.rowid AS chunk_id, cm.source, c.text, NULL AS bm25
+    FROM chunks_fts c
+    JOIN chunk_meta cm ON cm.chunk_id = c.rowid
+    WHERE chunks_fts MATCH ?
+    LIMIT ?
+"""
+
+def fts_query(text: str) -> str:
+    """Word tokens only, each quoted so punctuation can't be read as FTS operators (AND semantics)."""
+    toks = re.findall(r"[A-Za-z0-9_]+", text.lower())
+    return " ".join(f'"{t}"' for t in toks) if toks else ""
+
+# ----------------------------- build -----------------------------
+def tune_writer(con: sqlite3.Connection):
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")      # WAL stays consistent; only the last commit is at risk on power loss
+    con.execute(f"PRAGMA cache_size=-{CACHE_KIB}")
+    con.execute("PRAGMA temp_store=MEMORY")
+
+def _batches(rows: Iterable[Tuple], size: int):
+    batch = []
+    for r in rows:
+        batch.append(r)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def bulk_insert(con: sqlite3.Connection, rows: Iterable[Tuple[int, int, str, str]],
+                batch: int = INSERT_BATCH) -> int:
+    """
+    Insert (chunk_id, doc_id, source, text) rows into chunk_meta and chunks_fts.
+    Runs inside the caller's transaction; returns the number of rows.
+    """
+    n = 0
+    for part in _batches(rows, batch):
+        con.executemany("INSERT INTO chunk_meta(chunk_id, doc_id, source) VALUES (?,?,?)",
+                        [(cid, did, src) for cid, did, src, _ in part])
+        con.executemany("INSERT INTO chunks_fts(rowid, text, chunk_id, doc_id) VALUES (?,?,?,?)",
+                        [(cid, text, cid, did) for cid, did, _, text in part])
+        n += len(part)
+    return n
+
+def optimize(con: sqlite3.Connection):
+    """Merge all FTS5 segments into one b-tree (fewer segments to scan per MATCH)."""
+    con.execute("INSERT INTO chunks_fts(chunks_fts) VALUES('optimize')")
+
+# ----------------------------- query -----------------------------
+class KeywordEngine:
+    def __init__(self, db_path: str, mmap_bytes: int = MMAP_BYTES, cache_kib: int = CACHE_KIB):
+        self.db_path = str(db_path)
+        self.mmap_bytes = mmap_bytes
+        self.cache_kib = cache_kib
+        self.has_bm25 = True
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cons: List[sqlite3.Connection] = []
+
+    def _con(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False,
+                                  cached_statements=32)
+            con.execute(f"PRAGMA mmap_size={self.mmap_bytes}")
+            con.execute(f"PRAGMA cache_size=-{self.cache_kib}")
+            con.execute("PRAGMA query_only=ON")
+            self._local.con = con
+            with self._lock:
+                self._cons.append(con)
+        return con
+
+    def search(self, query: str, k: int = 5, raw: bool = False) -> List[Dict]:
+        """
+        Top-k chunks by BM25. 'score' is higher-is-better (= -bm25), 'kw_bm25' the raw value.
+        raw=True passes `query` to MATCH as is (FTS5 syntax: OR, NEAR, prefix*...).
+        """
+        q = query if raw else fts_query(query)
+        if not q:
+            return []
+        con = self._con()
+        if self.has_bm25:
+            try:
+                rows = con.execute(SEARCH_SQL, (q, k)).fetchall()
+            except sqlite3.OperationalError as e:
+                if "bm25" not in str(e):
+                    raise
+                self.has_bm25 = False
+        if not self.has_bm25:
+            rows = con.execute(SEARCH_SQL_NO_BM25, (q, k)).fetchall()
+
+        return [{
+            "score": -float(bm25) if bm25 is not None else 0.0,   # invert so higher is better
+            "kw_bm25": float(bm25) if bm25 is not None else None,
+            "text": text,
+            "source": source,
+            "chunk_id": int(chunk_id),
+            "algo": "keyword",
+        } for chunk_id, source, text, bm25 in rows]
+
+    def close(self):
+        with self._lock:
+            for con in self._cons:
+                con.close()
+            self._cons.clear()
+        self._local = threading.local()
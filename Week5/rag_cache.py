@@ -0,0 +1,184 @@
+"""
+Layered cache for the notebook's ask_llm path.
+
+- query embeddings: in-memory LRU keyed by query text (skips the encoder)
+- retrieval results: in-memory LRU keyed by (query, k, alpha, use_mmr, index version)
+- answers: SQLite table keyed by a hash of (model, temperature, prompt), so a repeated
+  question with the same retrieved passages costs no LLM call, across kernel restarts
+
+Every lookup first reads the index version (IncrementalBuilder.version). When
+it has moved since the last call, the retrieval LRU is cleared and answers written
+under an older version are deleted: a rebuild never serves stale passages or answers.
+Query embeddings depend only on the model, so they survive rebuilds.
+"""
+from collections import OrderedDict
+import hashlib, sqlite3, threading, time
+from typing import Callable, Hashable, List
+
+import numpy as np
+
+class LRUCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.data: "OrderedDict[Hashable, object]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        with self.lock:
+            value = self.data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value):
+        if self.max_entries <= 0:
+            return
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.data),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+            }
+
+class AnswerStore:
+    PRUNE_EVERY = 256   # writes between size checks
+
+    def __init__(self, path: str, max_entries: int = 10_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self._con().execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                key           TEXT PRIMARY KEY,
+                answer        TEXT NOT NULL,
+                index_version INTEGER NOT NULL,
+                used_at       REAL NOT NULL
+            )
+        """)
+
+    def _con(self) -> sqlite3.Connection:
+        con = getattr(self.local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self.local.con = con
+        return con
+
+    def get(self, key: str) -> str | None:
+        con = self._con()
+        row = con.execute("SELECT answer FROM answers WHERE key = ?", (key,)).fetchone()
+        with self.lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        con.execute("UPDATE answers SET used_at = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, answer: str, index_version: int):
+        con = self._con()
+        con.execute("INSERT OR REPLACE INTO answers(key, answer, index_version, used_at) VALUES (?, ?, ?, ?)",
+                    (key, answer, index_version, time.time()))
+        with self.lock:
+            self.writes += 1
+            prune = self.writes % self.PRUNE_EVERY == 0
+        if prune:
+            con.execute("""
+                DELETE FROM answers WHERE key IN (
+                    SELECT key FROM answers ORDER BY used_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def drop_before(self, index_version: int) -> int:
+        return self._con().execute("DELETE FROM answers WHERE index_version < ?", (index_version,)).rowcount
+
+    def stats(self) -> dict:
+        n = self._con().execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": n,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+            }
+
+class RAGCache:
+    def __init__(self, path: str, index_version: Callable[[], int], max_queries: int = 4096,
+                 max_results: int = 1024, max_answers: int = 10_000):
+        self.index_version = index_version
+        self.queries = LRUCache(max_queries)
+        self.results = LRUCache(max_results)
+        self.answers = AnswerStore(path, max_answers)
+        self.version = None
+        self.invalidations = 0
+
+    def sync(self) -> int:
+        """Current index version; drops every layer's stale entries when it has changed."""
+        version = self.index_version()
+        if version != self.version:
+            if self.version is not None:
+                self.invalidations += 1
+            self.results.clear()
+            self.answers.drop_before(version)
+            self.version = version
+        return version
+
+    def embed_queries(self, texts: List[str], embed: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """embed(texts) through the query LRU; misses are encoded in one call."""
+        if not texts:
+            return embed(texts)
+        vecs = [self.queries.get(t) for t in texts]
+        todo = list(dict.fromkeys(t for t, v in zip(texts, vecs) if v is None))
+        if todo:
+            fresh = dict(zip(todo, embed(todo)))
+            for t, v in fresh.items():
+                self.queries.put(t, v)
+            vecs = [fresh[t] if v is None else v for t, v in zip(texts, vecs)]
+        return np.stack(vecs).astype("float32", copy=False)
+
+    @staticmethod
+    def answer_key(prompt: str, model: str, temperature: float) -> str:
+        h = hashlib.sha256(f"{model}\0{temperature}\0".encode())
+        h.update(prompt.encode("utf-8"))
+        return h.hexdigest()
+
+    def stats(self) -> dict:
+        return {
+            "index_version": self.version,
+            "invalidations": self.invalidations,
+            "query_embeddings": self.queries.stats(),
+            "retrieval": self.results.stats(),
+            "answers": self.answers.stats(),
+        }
+
+    def report(self) -> str:
+        s = self.stats()
+        return "\n".join(
+            [f"RAG cache (index version {s['index_version']}, {s['invalidations']} invalidations)"]
+            + [f"  {name:<17} {s[name]['hits']:>5} hits / {s[name]['misses']:>5} misses "
+               f"(hit rate {s[name]['hit_rate']}), {s[name]['entries']} entries"
+               for name in ("query_embeddings", "retrieval", "answers")])
@@ -0,0 +1,175 @@
+"""
+Batched retrieval core for the RAG notebook.
+
+Every entry point takes a list of queries: they are embedded in one encode call
+and searched with one index.search over the query matrix. MMR runs as matrix
+updates over all queries at once (a running max-similarity vector per query
+instead of re-scoring every candidate against every pick), and dense/keyword
+min-max normalisation + alpha fusion is done with array ops.
+
+Results are the same dicts the notebook's dense_search / search_mmr /
+hybrid_search have always returned.
+"""
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+def minmax(a: np.ndarray) -> np.ndarray:
+    a = np.asarray(a, dtype="float32")
+    if a.size == 0:
+        return a
+    lo, hi = float(a.min()), float(a.max())
+    if hi - lo < 1e-9:
+        return np.full_like(a, 0.5)
+    return (a - lo) / (hi - lo)
+
+def mmr_select(sim_q: np.ndarray, cand: np.ndarray, k: int, lambda_mult: float = 0.6,
+               groups: np.ndarray | None = None, per_group_cap: int = 1,
+               valid: np.ndarray | None = None) -> np.ndarray:
+    """
+    Batched greedy MMR.
+
+    sim_q:  (B, n) query/candidate similarity
+    cand:   (B, n, d) candidate embeddings
+    groups: (B, n) int group id per candidate (e.g. source PDF), capped at per_group_cap picks
+    valid:  (B, n) bool, False for padding
+    Returns (B, k) candidate positions, -1 where fewer than k could be picked.
+    """
+    B, n = sim_q.shape
+    gram = np.einsum("bnd,bmd->bnm", cand, cand)           # pairwise candidate similarity
+    max_sim = np.full((B, n), -np.inf, dtype="float32")     # similarity to the closest pick so far
+    blocked = np.zeros((B, n), dtype=bool) if valid is None else ~valid
+    counts = None
+    if groups is not None:
+        counts = np.zeros((B, int(groups.max(initial=0)) + 1), dtype=np.int32)
+        blocked |= per_group_cap <= 0
+    picks = np.full((B, k), -1, dtype=np.int64)
+    rows = np.arange(B)
+
+    for step in range(k):
+        penalty = np.where(np.isneginf(max_sim), 0.0, max_sim)
+        score = lambda_mult * sim_q - (1.0 - lambda_mult) * penalty
+        score = np.where(blocked, -np.inf, score)
+        best = score.argmax(axis=1)
+        ok = np.isfinite(score[rows, best])
+        if not ok.any():
+            break
+        r, j = rows[ok], best[ok]
+        picks[r, step] = j
+        blocked[r, j] = True
+        max_sim[r] = np.maximum(max_sim[r], gram[r, j])
+        if counts is not None:
+            counts[r, groups[r, j]] += 1
+            blocked[r] |= counts[r[:, None], groups[r]] >= per_group_cap
+    return picks
+
+def fuse(dense_ids: np.ndarray, dense_scores: np.ndarray, kw_ids: np.ndarray, kw_bm25: np.ndarray,
+         alpha: float):
+    """
+    Union of one query's dense and keyword hits (dense order first), each side
+    min-max normalised, blended as alpha*dense + (1-alpha)*keyword.
+    Missing dense scores count as 0; missing BM25 as 1.2x the worst BM25 seen.
+    """
+    kw_only = ~np.isin(kw_ids, dense_ids)
+    ids = np.concatenate([dense_ids, kw_ids[kw_only]])
+    dense = np.concatenate([dense_scores, np.zeros(kw_only.sum(), dtype="float32")])
+
+    kw_known = ~np.isnan(kw_bm25)
+    max_bad = float(kw_bm25[kw_known].max()) if kw_known.any() else 1.0
+    kw_raw = np.full(len(ids), max_bad * 1.2, dtype="float32")
+    pos = {int(c): p for p, c in enumerate(ids)}
+    at = np.array([pos[int(c)] for c in kw_ids], dtype=np.int64)
+    if len(at):
+        kw_raw[at[kw_known]] = kw_bm25[kw_known]
+
+    dense_n, kw_n = minmax(dense), minmax(-kw_raw)
+    final = alpha * dense_n + (1.0 - alpha) * kw_n
+    order = np.argsort(-final, kind="stable")
+    return ids[order], final[order], dense_n[order], kw_n[order]
+
+def _bm25(hit: Dict) -> float:
+    """Raw BM25 of a keyword hit (lower is better); its 'score' is -bm25 when kw_bm25 is absent."""
+    b = hit.get("kw_bm25", -hit["score"])
+    return np.nan if b is None else b
+
+class Retriever:
+    """
+    index:   faiss index whose ids are chunk ids
+    embs:    (n_ids, d) float32 (np.memmap is fine), row == chunk id
+    docs, metadatas: chunk_id -> text / {"source": ...}
+    embed:   list[str] -> normalized (len, d) float32
+    keyword: (query, k) -> keyword_search-style hit dicts
+    """
+
+    def __init__(self, index, embs, docs, metadatas, embed: Callable[[List[str]], np.ndarray],
+                 keyword: Callable[[str, int], List[Dict]] | None = None):
+        self.index = index
+        self.embs = embs
+        self.docs = docs
+        self.metadatas = metadatas
+        self.embed = embed
+        self.keyword = keyword
+
+    def _hit(self, cid: int, score: float, algo: str, **extra) -> Dict:
+        return {"score": float(score), "text": self.docs[cid], "source": self.metadatas[cid]["source"],
+                "chunk_id": int(cid), "algo": algo, **extra}
+
+    # ----------------------------- dense -----------------------------
+    def _search(self, Q: np.ndarray, k: int):
+        kk = min(k, len(self.docs))
+        if kk <= 0:
+            return np.empty((len(Q), 0), "float32"), np.empty((len(Q), 0), np.int64)
+        return self.index.search(np.ascontiguousarray(Q, dtype="float32"), kk)
+
+    def dense_batch(self, queries: Sequence[str], k: int = 5, Q: np.ndarray | None = None) -> List[List[Dict]]:
+        Q = self.embed(list(queries)) if Q is None else Q
+        D, I = self._search(Q, k)
+        return [[self._hit(int(i), d, "dense") for d, i in zip(Dr, Ir) if i >= 0] for Dr, Ir in zip(D, I)]
+
+    # ----------------------------- MMR -----------------------------
+    def mmr_batch(self, queries: Sequence[str], k: int = 5, fetch_k: int = 40, lambda_mult: float = 0.6,
+                  per_source_cap: int = 1, Q: np.ndarray | None = None) -> List[List[Dict]]:
+        Q = self.embed(list(queries)) if Q is None else Q
+        _, I = self._search(Q, fetch_k)
+        if I.shape[1] == 0:
+            return [[] for _ in range(len(Q))]
+        valid = I >= 0
+        ids = np.where(valid, I, 0)
+        cand = np.asarray(self.embs[ids.ravel()], dtype="float32").reshape(*ids.shape, -1)
+        sim_q = np.einsum("bnd,bd->bn", cand, Q)
+
+        srcs = np.array([[self.metadatas[int(c)]["source"] if v else "" for c, v in zip(r, vr)]
+                         for r, vr in zip(ids, valid)], dtype=object)
+        _, groups = np.unique(srcs.ravel(), return_inverse=True)
+        picks = mmr_select(sim_q, cand, k, lambda_mult, groups.reshape(ids.shape), per_source_cap, valid)
+
+        return [[self._hit(int(ids[b, j]), sim_q[b, j], "mmr") for j in row if j >= 0]
+                for b, row in enumerate(picks)]
+
+    # ----------------------------- hybrid -----------------------------
+    def hybrid_batch(self, queries: Sequence[str], k: int = 3, k_dense: int = 10, k_kw: int = 10,
+                     alpha: float = 0.6, use_mmr: bool = False, Q: np.ndarray | None = None) -> List[List[Dict]]:
+        Q = self.embed(list(queries)) if Q is None else Q
+        dense = (self.mmr_batch(queries, k=k_dense, fetch_k=max(40, 3 * k_dense), Q=Q) if use_mmr
+                 else self.dense_batch(queries, k=k_dense, Q=Q))
+        out = []
+        for q, d_hits in zip(queries, dense):
+            kw_hits = self.keyword(q, k_kw) if self.keyword else []
+            d_ids = np.array([h["chunk_id"] for h in d_hits], dtype=np.int64)
+            d_sc = np.array([h["score"] for h in d_hits], dtype="float32")
+            k_ids = np.array([h["chunk_id"] for h in kw_hits], dtype=np.int64)
+            k_bm = np.array([_bm25(h) for h in kw_hits], dtype="float32")
+            ids, final, dn, kn = fuse(d_ids, d_sc, k_ids, k_bm, alpha)
+            out.append([{
+                "chunk_id": int(c), "source": self.metadatas[int(c)]["source"], "text": self.docs[int(c)],
+                "dense": float(dn[j]), "kw": float(kn[j]), "score": float(final[j]), "algo": "hybrid",
+            } for j, c in enumerate(ids[:k])])
+        return out
+
+    def search_batch(self, queries: Sequence[str], k: int = 3, mode: str = "hybrid", **kw) -> List[List[Dict]]:
+        """One encode + one index.search for all `queries`; mode is 'dense', 'mmr' or 'hybrid'."""
+        if mode == "dense":
+            return self.dense_batch(queries, k=k, **kw)
+        if mode == "mmr":
+            return self.mmr_batch(queries, k=k, **kw)
+        return self.hybrid_batch(queries, k=k, **kw)
@@ -0,0 +1,95 @@
+# test_chunk_store.py
+# Crash safety of chunk_store commits: a commit that dies part-way (here: while
+# compacting the blob) must leave the previous generation readable, and the next
+# commit must publish a consistent store.
+#
+#   python -m pytest -q test_chunk_store.py
+
+import json, os
+
+import numpy as np
+import pytest
+
+import chunk_store
+
+CHUNK_BYTES = 20_000
+N_SOURCES, PER_SOURCE = 20, 4      # ~1.6 MB blob: big enough to be compacted
+
+def text(cid: int) -> str:
+    return f"chunk {cid} " + "x" * CHUNK_BYTES
+
+def ids_of(src: int) -> np.ndarray:
+    return np.arange(src * PER_SOURCE, (src + 1) * PER_SOURCE, dtype="int64")
+
+def build(index_dir):
+    chunk_store.update(index_dir, N_SOURCES * PER_SOURCE, np.empty(0, dtype="int64"),
+                       [(ids_of(s), [text(i) for i in ids_of(s)], f"p{s}.pdf") for s in range(N_SOURCES)])
+
+def remove_most(index_dir):
+    """Drop 3/4 of the chunks and add one source: enough garbage to trigger compaction."""
+    removed = np.concatenate([ids_of(s) for s in range(15)])
+    new = ids_of(N_SOURCES)
+    chunk_store.update(index_dir, (N_SOURCES + 1) * PER_SOURCE, removed,
+                       [(new, [text(i) for i in new], f"p{N_SOURCES}.pdf")])
+
+def read_all(index_dir):
+    store = chunk_store.ChunkStore(index_dir)
+    try:
+        return {cid: (store.texts[cid], store.metas[cid]["source"]) for cid in store.texts}
+    finally:
+        store.close()
+
+class Crash(Exception):
+    pass
+
+def fail_on_call(monkeypatch, module, name, n):
+    """Make the n-th call of module.name raise Crash."""
+    real, calls = getattr(module, name), []
+
+    def wrapper(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == n:
+            raise Crash(f"{name} call {n}")
+        return real(*args, **kwargs)
+    monkeypatch.setattr(module, name, wrapper)
+
+@pytest.mark.parametrize("target, n", [("save", 1), ("save", 2), ("save", 3), ("replace", 1)])
+def test_crash_during_compacting_commit(tmp_path, monkeypatch, target, n):
+    index_dir = str(tmp_path)
+    build(index_dir)
+    before = read_all(index_dir)
+    assert len(before) == N_SOURCES * PER_SOURCE
+
+    with monkeypatch.context() as m:
+        fail_on_call(m, chunk_store.np if target == "save" else chunk_store.os, target, n)
+        with pytest.raises(Crash):
+            remove_most(index_dir)
+
+    # The old generation is untouched: same texts, same sources
+    assert read_all(index_dir) == before
+
+    # The retried update publishes the compacted store
+    remove_most(index_dir)
+    after = read_all(index_dir)
+    expected = {int(i): (text(i), f"p{i // PER_SOURCE}.pdf") for i in range(15 * PER_SOURCE, (N_SOURCES + 1) * PER_SOURCE)}
+    assert after == expected
+    blob = [f for f in os.listdir(index_dir) if f.endswith(".bin")]
+    assert len(blob) == 1 and os.path.getsize(os.path.join(index_dir, blob[0])) < (len(expected) + 1) * (CHUNK_BYTES + 20)
+
+def test_legacy_store_is_migrated(tmp_path):
+    """Stores with the fixed pre-generation file names are read, then superseded by chunks.json."""
+    index_dir = str(tmp_path)
+    build(index_dir)
+    m = chunk_store._read_manifest(index_dir)
+    for key, legacy in (("blob", chunk_store.BLOB), ("offsets", chunk_store.OFFSETS),
+                        ("sources", chunk_store.SOURCES), ("positions", chunk_store.POSITIONS)):
+        os.replace(os.path.join(index_dir, m[key]), os.path.join(index_dir, legacy))
+    with open(os.path.join(index_dir, chunk_store.SOURCE_NAMES), "w", encoding="utf-8") as f:
+        json.dump(m["names"], f)
+    os.remove(os.path.join(index_dir, chunk_store.MANIFEST))
+    before = read_all(index_dir)
+    assert len(before) == N_SOURCES * PER_SOURCE
+
+    remove_most(index_dir)
+    assert not os.path.exists(os.path.join(index_dir, chunk_store.OFFSETS))
+    assert len(read_all(index_dir)) == 6 * PER_SOURCE